@@ -0,0 +1,92 @@
+import math
+import os
+import sys
+
+import numpy
+from PIL import Image, ImageDraw
+
+from cartographer import BLACK, BLUE, DARK_GREY, GREY, RED, WHITE, map_layers, rgba
+from history import read_history
+from raster import Projection, splat
+from snapshot import Snapshot
+
+
+class Animator:
+    def __init__(self, radius, size=1024, backdrop=None):
+        self.projection = Projection(radius, size)
+        image = Image.new("RGBA", (size, size), BLACK)
+        ImageDraw.Draw(image).ellipse(self.projection.plane, outline=DARK_GREY)
+        self.canvas = numpy.array(image)
+        if backdrop is not None:
+            x, y, z = backdrop
+            self._splat(x, y, z, numpy.broadcast_to(rgba(GREY), (len(x), 4)))
+        self._positions = {}
+        self._populations = {}
+
+    def _splat(self, x, y, z, colours):
+        sx, sy, star_size = self.projection(numpy.asarray(x), numpy.asarray(y), numpy.asarray(z))
+        splat(self.canvas, sx, sy, star_size, colours)
+
+    def _colour(self, hip):
+        # Brighter stars hold more people, saturating at ten billion
+        population = sum(self._populations[hip].values())
+        brightness = 0.35 + 0.65 * min(1, max(0, math.log10(max(population, 1)) / 10))
+        base = rgba([RED, BLUE][hip % 2]).astype(numpy.float64)
+        base[:3] *= brightness
+        return base.astype(numpy.uint8)
+
+    def apply(self, delta):
+        touched = set()
+        for hip, planet, position, founding_year in delta["colonised"]:
+            self._positions[hip] = position
+            self._populations.setdefault(hip, {})[planet] = 0
+            touched.add(hip)
+        for hip, planet, population in delta["population"]:
+            self._populations.setdefault(hip, {})[planet] = population
+            touched.add(hip)
+
+        touched = sorted(hip for hip in touched if hip in self._positions)
+        if touched:
+            x, y, z = zip(*(self._positions[hip] for hip in touched))
+            self._splat(x, y, z, numpy.array([self._colour(hip) for hip in touched]))
+
+    def frame(self, year):
+        image = Image.fromarray(self.canvas.copy(), "RGBA")
+        ImageDraw.Draw(image).text((10, 10), str(year + 1950), fill=WHITE[:3])
+        return image
+
+    def frames(self, history):
+        for delta in history:
+            self.apply(delta)
+            yield self.frame(delta["year"])
+
+
+def animator_for_snapshot(snapshot, size=1024):
+    table = snapshot.table()
+    radius, x, y, z, _ = map_layers(table.x, table.y, table.z, table.distance, snapshot.star_population() > 0,
+                                    table.hip % 2)
+    return Animator(radius, size, (x, y, z))
+
+
+def animator_for_history(history_path, size=1024):
+    radius = max(math.sqrt(sum(c ** 2 for c in position))
+                 for delta in read_history(history_path) for _, _, position, _ in delta["colonised"])
+    return Animator(radius * 1.1, size)
+
+
+def save_animation(animator, history_path, output_path, duration=100):
+    frames = animator.frames(read_history(history_path))
+    if output_path.endswith(".gif") or output_path.endswith(".png"):
+        first = next(frames)
+        first.save(output_path, save_all=True, append_images=frames, duration=duration, loop=0)
+    else:
+        os.makedirs(output_path, exist_ok=True)
+        for n, frame in enumerate(frames):
+            frame.save("{}/{:04d}.png".format(output_path, n), "PNG")
+
+
+if __name__ == '__main__':
+    history_path = sys.argv[1] if len(sys.argv) > 1 else "colony_history.ndjson"
+    snapshot_path = sys.argv[2] if len(sys.argv) > 2 else "colony_map2.snap"
+    output_path = sys.argv[3] if len(sys.argv) > 3 else "colony.gif"
+    save_animation(animator_for_snapshot(Snapshot(snapshot_path)), history_path, output_path)
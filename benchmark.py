@@ -0,0 +1,106 @@
+import gc
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import catalogue
+import stellar_data
+from cartographer import draw_map, load_galaxy
+from growth import Colonies
+from habitability import HabitableIndex
+from stellar_obj import generate_planets
+
+# Roughly thirty neighbours inside the 20 pc colonisation radius, whatever the galaxy size
+DENSITY = 30 / (4 / 3 * math.pi * 20 ** 3)
+CLASSES = ["O5", "B3V", "A0", "F5V", "G2V", "K1III", "M4V", "K", "Am", "M"]
+QUERIES = 1000
+
+
+def synthetic_catalogue(size, directory, seed=0):
+    rng = random.Random(seed)
+    radius = (3 * size / (4 * math.pi * DENSITY)) ** (1 / 3)
+    stars = [{"HIP": hip, "rectascension": rng.uniform(0, 24), "declination": rng.uniform(-90, 90),
+              "distance": radius * rng.random() ** (1 / 3)} for hip in range(1, size + 1)]
+    classes = {str(star["HIP"]): rng.choice(CLASSES) for star in stars}
+
+    catalogue_path = os.path.join(directory, "starcatalogue.json")
+    spectypes_path = os.path.join(directory, "spectypes.json")
+    with open(catalogue_path, "w") as catalogue_file:
+        json.dump({"Stars": stars}, catalogue_file)
+    with open(spectypes_path, "w") as spectypes_file:
+        json.dump(classes, spectypes_file)
+    return catalogue_path, spectypes_path
+
+
+class Benchmark:
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.results = []
+
+    def measure(self, stage, size, func, *args, **kwargs):
+        gc.collect()
+        if self.trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        value = func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        peak = None
+        if self.trace_memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        self.results.append({"stage": stage, "stars": size, "seconds": elapsed, "peak_bytes": peak})
+        print("{:>8} stars  {:<20} {:>10.4f}s  {}".format(size, stage, elapsed,
+                                                          "" if peak is None else "{:,} bytes".format(peak)))
+        return value
+
+    def run(self, size, seed=0):
+        with tempfile.TemporaryDirectory() as directory:
+            catalogue_path, spectypes_path = synthetic_catalogue(size, directory, seed)
+            cache_path = os.path.join(directory, "catalogue.npz")
+
+            raw = self.measure("load_cold", size, stellar_data.load_catalogue, catalogue_path, spectypes_path, cache_path)
+            self.measure("load_warm", size, stellar_data.load_catalogue, catalogue_path, spectypes_path, cache_path)
+            starmap = self.measure("load_starmap", size, stellar_data.load_starmap, raw)
+
+            sample = random.Random(seed).sample(starmap, min(QUERIES, len(starmap)))
+            self.measure("spatial_index", size, sample[0].closest_stars, starmap, radius=20)
+            self.measure("closest_stars", size, lambda: [star.closest_stars(starmap, radius=20) for star in sample])
+            self.measure("generate_planets", size, generate_planets, starmap)
+
+            habitable = HabitableIndex(starmap, radius=20)
+            colonies = Colonies.from_starmap(starmap)
+            for star in starmap:
+                for planet in habitable.habitable_planets(star):
+                    planet.population = 2e8
+                    colonies.add(planet, 0)
+            habitable.build()
+            self.measure("simulation_year", size, catalogue.simulate_year, habitable, colonies, 130, seed)
+            colonies.sync()
+
+            json_path = os.path.join(directory, "galaxy.json")
+
+            def json_round_trip():
+                with open(json_path, "w") as out_file:
+                    json.dump([star.to_json() for star in starmap], out_file)
+                return load_galaxy(json_path)
+
+            loaded = self.measure("json_round_trip", size, json_round_trip)
+            self.measure("draw_map", size, draw_map, loaded, 1024)
+
+    def write(self, path):
+        with open(path, "w") as out_file:
+            json.dump(self.results, out_file, indent=2)
+
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]
+    benchmark = Benchmark(trace_memory=os.environ.get("BENCHMARK_MEMORY", "1") != "0")
+    for size in sizes:
+        benchmark.run(size)
+    benchmark.write("benchmark.json")
@@ -1,10 +1,15 @@
 import json
-import random
+import sys
 
-from PIL import Image, ImageDraw, ImageColor
+import numpy
 
+from planet_store import PlanetStore
+from query import galaxy_for
+from raster import Projection, render
+from snapshot import Snapshot
+from star_table import StarTable
 from stellar_obj import Star
-from util import filter_to_inhabited
+from tiles import TilePyramid, read_manifest
 
 WHITE = (256, 256, 256, 255)
 RED = (256,0,0,256)
@@ -15,42 +20,83 @@ TRANSPARENT_GREY = (64, 64, 64, 128)
 BLACK = (0, 0, 0, 255)
 
 
-def load_galaxy(galaxy_json_path):
-    with open(galaxy_json_path) as galaxy_json_file:
-        galaxy_json = json.load(galaxy_json_file)
-        return [Star(**star) for star in galaxy_json]
+def load_galaxy(galaxy_path):
+    if galaxy_path.endswith(".snap"):
+        return Snapshot(galaxy_path).starmap()
+    with open(galaxy_path) as galaxy_json_file:
+        if galaxy_path.endswith(".ndjson"):
+            # Exports may hold several years, the last one is the galaxy as it ended up
+            galaxy_json = [json.loads(line) for line in galaxy_json_file]
+            galaxy_json = [star for star in galaxy_json if star["year"] == galaxy_json[-1]["year"]]
+        else:
+            galaxy_json = json.load(galaxy_json_file)
+        store = PlanetStore(seed=galaxy_json[0].get("seed", 0) if galaxy_json else 0)
+        starmap = [Star(store=store, **star) for star in galaxy_json]
+        StarTable.from_stars(starmap)
+        return starmap
 
 
-def draw_map(starmap, size=1024):
-    inhabited_space = filter_to_inhabited(starmap)
-    print(len(inhabited_space))
-    radius = max(star.distance for star in inhabited_space)
-    print(radius)
+def rgba(colour):
+    return numpy.clip(colour, 0, 255).astype(numpy.uint8)
 
-    map_image = Image.new("RGBA", (size, size), BLACK)
-    canvas = ImageDraw.Draw(map_image)
 
-    border = size * .125
-    inner = size * .75
-    inner_half = inner / 2
-    midpoint = size * .5
+def inhabited_stars(starmap):
+    # Only planets that already exist can hold people, so this never generates new systems
+    return galaxy_for(starmap).query().inhabited().mask()
 
-    canvas.ellipse(((border, border + inner * .25), (border + inner, border + inner * .75)), outline=DARK_GREY)
 
-    for star in inhabited_space:
-        wx, wy, wz = star.position
-        sx = midpoint + inner_half * (wx / radius)
-        plane_sy = midpoint + inner_half * (wy / radius / 2)
-        sy = plane_sy + inner_half * (wz / radius)
-        star_size = (wy + radius) / (radius * 2) * 3.5 + 0.5
-        # canvas.line(((sx, plane_sy), (sx, sy)), DARK_GREY, 1)
-        canvas.ellipse(((sx - star_size, sy - star_size), (sx + star_size, sy + star_size)),
-                       fill=random.choice([RED,BLUE]) if any(planet.population > 0 for planet in star.planets) else GREY)
+def draw_map(starmap, size=1024, tile_size=2048, rng=None):
+    table = StarTable.for_stars(starmap)
+    return draw_columns(table.x, table.y, table.z, table.distance, inhabited_stars(starmap), size, tile_size, rng)
 
-    return map_image
+
+def draw_snapshot(snapshot, size=1024, tile_size=2048, rng=None):
+    table = snapshot.table()
+    return draw_columns(table.x, table.y, table.z, table.distance, snapshot.star_population() > 0, size, tile_size, rng)
+
+
+def map_layers(x, y, z, distance, inhabited, palette, radius=None):
+    if radius is None:
+        visible = numpy.abs(distance) < numpy.abs(distance[inhabited]).max() * 1.1
+    else:
+        visible = numpy.abs(distance) <= radius
+    radius = distance[visible].max() if radius is None else radius
+
+    colonised = rgba([RED, BLUE])[palette[visible]]
+    colours = numpy.where(inhabited[visible, None], colonised, rgba(GREY))
+    return radius, x[visible], y[visible], z[visible], colours
+
+
+def draw_columns(x, y, z, distance, inhabited, size=1024, tile_size=2048, rng=None):
+    rng = numpy.random.default_rng() if rng is None else rng
+    radius, x, y, z, colours = map_layers(x, y, z, distance, inhabited, rng.integers(0, 2, len(x)))
+    return render(Projection(radius, size), x, y, z, colours, rgba(BLACK), tile_size, DARK_GREY)
+
+
+def tile_snapshot(snapshot, path="tiles", max_zoom=5, radius=None, rebuild=False):
+    # The projection and the stars drawn both follow the radius, so the tiles keep the one they were drawn
+    # at and only the stars that changed inside it redraw; rebuild fits it to the colonies again
+    if radius is None and not rebuild:
+        radius = read_manifest(path).get("radius")
+    table = snapshot.table()
+    inhabited = snapshot.star_population() > 0
+    # Colours follow the HIP number rather than chance so unchanged stars keep their tiles between runs
+    radius, x, y, z, colours = map_layers(table.x, table.y, table.z, table.distance, inhabited, table.hip % 2, radius)
+    if numpy.abs(table.distance[inhabited]).max() > radius:
+        print("Colonies reach past the {:.1f} pc the tiles were drawn at; rebuild to fit them".format(radius))
+    pyramid = TilePyramid(x, y, z, colours, radius, max_zoom, rgba(BLACK), DARK_GREY)
+    rendered, skipped = pyramid.write(path)
+    print("Rendered", rendered, "tiles,", skipped, "unchanged")
 
 
 if __name__ == '__main__':
-    colony_map = load_galaxy("colony_map2.json")
-    with open("colony.png", "wb") as output:
-        draw_map(colony_map, 2048).save(output, "PNG")
+    if len(sys.argv) > 1 and sys.argv[1] == "tiles":
+        max_zoom = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+        # A third argument fixes the radius in parsecs; "rebuild" refits it to the colonies and redraws everything
+        rebuild = len(sys.argv) > 3 and sys.argv[3] == "rebuild"
+        radius = float(sys.argv[3]) if len(sys.argv) > 3 and not rebuild else None
+        tile_snapshot(Snapshot("colony_map2.snap"), "tiles", max_zoom, radius, rebuild)
+    else:
+        size = int(sys.argv[1]) if len(sys.argv) > 1 else 2048
+        with open("colony.png", "wb") as output:
+            draw_snapshot(Snapshot("colony_map2.snap"), size).save(output, "PNG")
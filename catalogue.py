@@ -1,42 +1,169 @@
-import json
+import os
 import random
+from collections import defaultdict
 
-from stellar_data import STARMAP, get_star_name
-from util import filter_by_distance
-
-print("There are {} stars".format(len(STARMAP)))
-
-CURRENT_YEAR = 130
-
-for _ in range(170):
-    print("IT IS ", CURRENT_YEAR + 1950)
-    for star in STARMAP:
-        for planet in star.planets:
-            planet.grow(CURRENT_YEAR)
-            # if planet.population > 0:
-                # print(planet.name, "has a population of", "{:,}".format(planet.population), "and is growing by",
-                #       str(round((planet.growth_rate(CURRENT_YEAR) - 1) * 100, 2)) + "%")
-            if planet.population > 1e8:
-                colonists = int(planet.population * 0.05)
-                planet.population -= colonists
-
-                colonisation_candidates = [s for s in filter_by_distance(20, planet.star.closest_stars(STARMAP)) if any(p.habitable for p in s.planets)]
-                while colonists > 0:
-                    destination_star = random.choice(colonisation_candidates)
-                    destination_planet = random.choice([p for p in destination_star.planets if p.habitable])
-                    if destination_planet.founding_year is None:
-                        destination_planet.founding_year = CURRENT_YEAR
-                        if str(destination_star.hip) in destination_star.name:
-                            destination_star.name = get_star_name()
-                            print("HIP", destination_star.hip, "was renamed", destination_star.name, "when it was colonised!")
-                        print(destination_planet.name, "was colonised!")
-                    destination_planet.population += min(1e6, colonists)
-                    colonists -= min(1e6, colonists)
-
-    CURRENT_YEAR += 1
-
-output = [star.to_json() for star in STARMAP]
-with open("colony_map2.json", "w") as out_file:
-    json.dump(output, out_file)
-
-print()
+import numpy
+
+import checkpoint
+import instrumentation
+import stellar_data
+from growth import Colonies
+from habitability import HabitableIndex
+from history import HistoryRecorder, truncate_history
+from network import ColonisationNetwork
+from export import Exporter, sink_for
+
+
+def planet_key(planet):
+    return planet.star.hip, planet.index
+
+
+def emigration_rng(seed, current_year, planet):
+    # Each source gets its own stream, so the draws don't depend on the order sources are processed in
+    return numpy.random.default_rng([seed, current_year, *planet_key(planet)])
+
+
+def emigrate(habitable, planet, population, current_year, seed):
+    with instrumentation.phase("candidates"):
+        colonisation_candidates = habitable.destinations(planet.star)
+    if not colonisation_candidates:
+        return 0, [], numpy.zeros(0)
+    colonists = int(population * 0.05)
+    instrumentation.count("emigration_events")
+    instrumentation.count("chunks_moved", -(-colonists // 1000000))
+
+    with instrumentation.phase("emigration"):
+        destination_planets, arrivals = colonisation_candidates.distribute(colonists,
+                                                                           emigration_rng(seed, current_year, planet))
+    return colonists, destination_planets, arrivals
+
+
+def naming_rng(seed, star):
+    return random.Random("{}:name:{}".format(seed, star.hip))
+
+
+def name_colonies(new_colonies, seed):
+    for destination_planet in sorted(new_colonies, key=planet_key):
+        destination_star = destination_planet.star
+        instrumentation.count("planets_colonised")
+        if str(destination_star.hip) in destination_star.name:
+            with instrumentation.phase("renaming"):
+                destination_star.name = stellar_data.get_star_name(naming_rng(seed, destination_star))
+            print("HIP", destination_star.hip, "was renamed", destination_star.name, "when it was colonised!")
+        print(destination_planet.name, "was colonised!")
+
+
+def settle(colonies, arrivals, current_year, seed):
+    new_colonies = sorted((planet for planet in arrivals if planet not in colonies), key=planet_key)
+    for destination_planet in new_colonies:
+        colonies.add(destination_planet, current_year)
+    name_colonies(new_colonies, seed)
+    destinations = [colonies.index(planet) for planet in arrivals]
+    colonies.population[destinations] += list(arrivals.values())
+
+
+def count_frontier(network, colonies):
+    instruments = instrumentation.active()
+    if instruments.enabled and network is not None:
+        instruments.count("frontier_systems", len(network.frontier(network.colonised(colonies))))
+
+
+def simulate_year(habitable, colonies, current_year, seed):
+    # Every colony grows before any of them sends colonists, and planets settled this year first grow the
+    # next year. Emigration is worked out from the populations after growth and only settled once every
+    # source has sent its colonists, so a year's outcome doesn't depend on the order colonies are visited in
+    instruments = instrumentation.active()
+    instruments.start_year(current_year)
+    with instruments.phase("growth"):
+        colonies.grow(current_year)
+    instruments.count("planets_grown", len(colonies))
+
+    arrivals = defaultdict(float)
+    for source in colonies.over(1e8):
+        colonists, destination_planets, amounts = emigrate(habitable, colonies.planets[source],
+                                                           colonies.population[source], current_year, seed)
+        colonies.population[source] -= colonists
+        for destination_planet, amount in zip(destination_planets, amounts.tolist()):
+            arrivals[destination_planet] += amount
+    settle(colonies, arrivals, current_year, seed)
+    count_frontier(habitable.network, colonies)
+    instruments.end_year()
+
+
+if __name__ == '__main__':
+    # STARMAP_RESUME=checkpoints/200.npz carries on from that year; give it a new STARMAP_SEED and
+    # STARMAP_CHECKPOINTS directory to branch instead. A branch keeps its history and exports in its own
+    # checkpoint directory, so the run it came from keeps its output
+    RESUME = os.environ.get("STARMAP_RESUME")
+    CHECKPOINTS = os.environ.get("STARMAP_CHECKPOINTS", "checkpoints")
+    OUTPUT = CHECKPOINTS if RESUME and os.path.abspath(os.path.dirname(RESUME)) != os.path.abspath(CHECKPOINTS) \
+        else "."
+    os.makedirs(OUTPUT, exist_ok=True)
+    HISTORY = os.environ.get("STARMAP_HISTORY", os.path.join(OUTPUT, "colony_history.ndjson"))
+    CHAIN = checkpoint.read_chain(RESUME) if RESUME else []
+    if CHAIN:
+        STARMAP = stellar_data.load_starmap(seed=int(CHAIN[-1]["galaxy_seed"]))
+    else:
+        STARMAP = stellar_data.STARMAP
+    print("There are {} stars".format(len(STARMAP)))
+
+    instruments = instrumentation.from_environment()
+    CURRENT_YEAR = 130
+    END_YEAR = 300
+    colonies = Colonies.from_starmap(STARMAP)
+    SEED = None
+    if CHAIN:
+        CURRENT_YEAR, SEED = checkpoint.restore(CHAIN, STARMAP, colonies)
+        print("Resuming from", RESUME, "at", CURRENT_YEAR + 1950)
+    SEED = int(os.environ.get("STARMAP_SEED", SEED if SEED is not None else random.randrange(2 ** 32)))
+    print("Seed", SEED)
+
+    habitable = HabitableIndex(STARMAP, radius=20)
+    # Jumps only ever go between the same systems, so work the graph out once rather than every year
+    network = habitable.network = ColonisationNetwork(STARMAP, habitable, habitable.radius)
+    HOPS = network.hops()
+    print("{} habitable systems, {} reachable from Sol".format(len(network) - 1, numpy.count_nonzero(HOPS > 0)))
+    if CHAIN:
+        truncate_history(HISTORY, CURRENT_YEAR, checkpoint.history_path(RESUME, CHAIN))
+    history = HistoryRecorder(STARMAP, colonies, HISTORY, append=bool(CHAIN))
+    CHECKPOINT_EVERY = int(os.environ.get("STARMAP_CHECKPOINT_EVERY", 10))
+    # STARMAP_EXPORT=colony_map2.snap,colony_map2.ndjson,colonies.csv,colony_map2.sqlite picks the sinks
+    EXPORTS = os.environ.get("STARMAP_EXPORT", os.path.join(OUTPUT, "colony_map2.snap"))
+    exporter = Exporter([sink_for(path) for path in EXPORTS.split(",")])
+    EXPORT_EVERY = int(os.environ.get("STARMAP_EXPORT_EVERY", 0))
+    checkpoints = checkpoint.Checkpointer(CHECKPOINTS, STARMAP, colonies, SEED, RESUME, HISTORY)
+
+    PROCESSES = int(os.environ.get("STARMAP_PROCESSES", 1))
+    simulation = None
+    if PROCESSES > 1:
+        from parallel import ParallelSimulation
+        simulation = ParallelSimulation(STARMAP, colonies, SEED, PROCESSES, network=network)
+
+    while CURRENT_YEAR < END_YEAR:
+        print("IT IS ", CURRENT_YEAR + 1950)
+        if simulation is None:
+            simulate_year(habitable, colonies, CURRENT_YEAR, SEED)
+        else:
+            simulation.simulate_year(CURRENT_YEAR)
+        history.record(CURRENT_YEAR)
+        CURRENT_YEAR += 1
+        if CHECKPOINT_EVERY and (CURRENT_YEAR - 130) % CHECKPOINT_EVERY == 0:
+            checkpoints.save(CURRENT_YEAR)
+        if EXPORT_EVERY and (CURRENT_YEAR - 130) % EXPORT_EVERY == 0 and CURRENT_YEAR < END_YEAR:
+            colonies.sync()
+            exporter.export(STARMAP, CURRENT_YEAR, settled_only=True)
+
+    if simulation is not None:
+        simulation.close()
+    history.close()
+    if instruments.enabled:
+        instruments.write(os.environ["STARMAP_INSTRUMENT"])
+    colonies.sync()
+    exporter.export(STARMAP, CURRENT_YEAR, settled_only=True)
+    exporter.close()
+    print("{names} star names left, {expected_draws:.2f} draws per rename".format(
+        **stellar_data.NAME_GENERATOR.remaining()))
+    FRONTIER = network.frontier(network.colonised(colonies))
+    print("{} systems on the frontier, furthest {} jumps from Sol".format(len(FRONTIER), HOPS[FRONTIER].max(initial=0)))
+
+    print()
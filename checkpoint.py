@@ -0,0 +1,87 @@
+import os
+
+import numpy
+
+import stellar_data
+
+
+def read_chain(path):
+    # Each checkpoint only holds what changed since its parent, so resuming replays the chain from the root
+    chain = []
+    while path:
+        with numpy.load(path) as checkpoint:
+            data = {key: checkpoint[key] for key in checkpoint.files}
+        chain.append(data)
+        parent = str(data["parent"])
+        path = os.path.join(os.path.dirname(path), parent) if parent else None
+    return chain[::-1]
+
+
+def history_path(path, chain):
+    # Where the run that saved the checkpoint was writing its history, if it said
+    history = str(chain[-1]["history"]) if "history" in chain[-1] else ""
+    return os.path.join(os.path.dirname(path), history) if history else None
+
+
+def restore(chain, starmap, colonies):
+    if starmap[0]._store.seed != int(chain[-1]["galaxy_seed"]):
+        raise ValueError("Checkpoint was made for galaxy seed {}".format(int(chain[-1]["galaxy_seed"])))
+    stars = {star.hip: star for star in starmap}
+    generator = stellar_data.NAME_GENERATOR
+    for data in chain:
+        for (hip, index), founding_year in zip(data["colonies"].tolist(), data["founding_year"].tolist()):
+            colonies.add(stars[hip].planets[index], founding_year)
+        colonies.population[data["changed"]] = data["population"]
+        for hip, name in zip(data["renamed_hip"].tolist(), data["renamed_name"].tolist()):
+            stars[hip].name = name
+        generator.used.update(data["used_names"].tolist())
+    generator.used_probability = float(chain[-1]["used_probability"])
+    # The store is what a parallel run starts from, so bring it up to date before one is built
+    colonies.sync()
+    return int(chain[-1]["year"]), int(chain[-1]["seed"])
+
+
+class Checkpointer:
+    def __init__(self, directory, starmap, colonies, seed, parent=None, history=None):
+        self.directory = directory
+        self.starmap = starmap
+        self.colonies = colonies
+        self.seed = seed
+        self.parent = parent
+        self.history = history
+        self._mark()
+
+    def _mark(self):
+        self._count = len(self.colonies)
+        self._population = self.colonies.population.copy()
+        self._names = {star.hip: star.name for star in self.starmap}
+        self._used = set(stellar_data.NAME_GENERATOR.used)
+
+    def save(self, current_year):
+        colonies = self.colonies
+        population = colonies.population
+        changed = numpy.concatenate([numpy.flatnonzero(population[:self._count] != self._population),
+                                     numpy.arange(self._count, len(colonies))])
+        new = colonies.planets[self._count:]
+        renamed = [(star.hip, star.name) for star in self.starmap if star.name != self._names[star.hip]]
+        generator = stellar_data.NAME_GENERATOR
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, "{}.npz".format(current_year))
+        parent = os.path.relpath(self.parent, self.directory) if self.parent else ""
+        history = os.path.relpath(self.history, self.directory) if self.history else ""
+        with open(path + ".tmp", "wb") as out_file:
+            numpy.savez_compressed(
+                out_file, year=current_year, seed=self.seed, galaxy_seed=self.starmap[0]._store.seed, parent=parent,
+                history=history,
+                colonies=numpy.array([(p.star.hip, p.index) for p in new], dtype=numpy.int64).reshape(-1, 2),
+                founding_year=colonies.founding_year[self._count:], changed=changed, population=population[changed],
+                renamed_hip=numpy.array([hip for hip, _ in renamed], dtype=numpy.int64),
+                renamed_name=numpy.array([name for _, name in renamed], dtype=str),
+                used_names=numpy.array(sorted(generator.used - self._used), dtype=str),
+                used_probability=generator.used_probability)
+        os.replace(path + ".tmp", path)
+
+        self.parent = path
+        self._mark()
+        return path
@@ -0,0 +1,165 @@
+import csv
+import json
+import os
+import queue
+import sqlite3
+import threading
+
+from snapshot import SnapshotWriter, star_record
+
+
+class NDJSONSink:
+    def __init__(self, path):
+        self._file = open(path, "w")
+
+    def begin(self, year, seed):
+        self.year = year
+        self.seed = seed
+
+    def write(self, records):
+        # Unsettled systems are left out and regenerated on load, which needs the galaxy seed
+        self._file.writelines(json.dumps(dict(record, year=self.year, seed=self.seed)) + "\n" for record in records)
+
+    def end(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class SnapshotSink:
+    # The layout needs every star before the header can be written, so each export replaces the file whole
+    def __init__(self, path):
+        self.path = path
+
+    def begin(self, year, seed):
+        self._writer = SnapshotWriter(self.path, seed)
+
+    def write(self, records):
+        for record in records:
+            self._writer.add(record)
+
+    def end(self):
+        self._writer.close()
+
+    def close(self):
+        pass
+
+
+class CSVSink:
+    COLUMNS = ["year", "hip", "name", "stellar_class", "distance", "planets", "colonies", "population", "founded"]
+
+    def __init__(self, path):
+        self._file = open(path, "w", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(self.COLUMNS)
+
+    def begin(self, year, seed):
+        self.year = year
+
+    def write(self, records):
+        # One row per settled system; untouched stars would only repeat the catalogue
+        for record in records:
+            founded = [p["founding_year"] for p in record["planets"] if p["founding_year"] is not None]
+            if founded:
+                self._writer.writerow([self.year, record["HIP"], record["name"], record["stellar_class"],
+                                       record["distance"], len(record["planets"]), len(founded),
+                                       sum(p["population"] for p in record["planets"]), min(founded)])
+
+    def end(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class SQLiteSink:
+    def __init__(self, path):
+        self.path = path
+        self._db = None
+
+    def begin(self, year, seed):
+        # Connections belong to the thread that made them, so open on the writer thread
+        if self._db is None:
+            self._db = sqlite3.connect(self.path)
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS stars (year INTEGER, hip INTEGER, name TEXT, stellar_class TEXT,
+                    rectascension REAL, declination REAL, distance REAL, population REAL, founding_year INTEGER,
+                    PRIMARY KEY (year, hip));
+                CREATE TABLE IF NOT EXISTS planets (year INTEGER, hip INTEGER, planet INTEGER, name TEXT,
+                    orbital_distance REAL, rocky INTEGER, population REAL, founding_year INTEGER,
+                    PRIMARY KEY (year, hip, planet));
+            """)
+        self.year = year
+
+    def write(self, records):
+        self._db.executemany("INSERT OR REPLACE INTO stars VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", (
+            (self.year, r["HIP"], r["name"], r["stellar_class"], r["rectascension"], r["declination"], r["distance"],
+             sum(p["population"] for p in r["planets"]),
+             min((p["founding_year"] for p in r["planets"] if p["founding_year"] is not None), default=None))
+            for r in records))
+        self._db.executemany("INSERT OR REPLACE INTO planets VALUES (?, ?, ?, ?, ?, ?, ?, ?)", (
+            (self.year, r["HIP"], n, p["name"], p["orbital_distance"], p["rocky"], p["population"], p["founding_year"])
+            for r in records for n, p in enumerate(r["planets"])))
+
+    def end(self):
+        self._db.commit()
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+
+
+SINKS = {".ndjson": NDJSONSink, ".snap": SnapshotSink, ".csv": CSVSink, ".sqlite": SQLiteSink, ".db": SQLiteSink}
+
+
+def sink_for(path):
+    return SINKS[os.path.splitext(path)[1]](path)
+
+
+class Exporter:
+    def __init__(self, sinks, batch_size=1024, queue_size=64):
+        self.sinks = sinks
+        self.batch_size = batch_size
+        self._queue = queue.Queue(queue_size)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            method, args = self._queue.get()
+            # Sinks still get closed after a failure so their files aren't left open
+            if self._error is None or method == "close":
+                try:
+                    for sink in self.sinks:
+                        getattr(sink, method)(*args)
+                except Exception as error:
+                    self._error = error
+            if method == "close":
+                return
+
+    def _put(self, method, *args):
+        if self._error is not None:
+            raise self._error
+        self._queue.put((method, args))
+
+    def export(self, starmap, year, settled_only=False):
+        # Records are taken on this thread so they match the year being exported; the writer thread
+        # does all the encoding and I/O while the simulation moves on
+        self._put("begin", year, starmap[0]._store.seed if starmap else 0)
+        batch = []
+        for star in starmap:
+            batch.append(star_record(star, settled_only))
+            if len(batch) == self.batch_size:
+                self._put("write", batch)
+                batch = []
+        if batch:
+            self._put("write", batch)
+        self._put("end")
+
+    def close(self):
+        self._queue.put(("close", ()))
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
@@ -0,0 +1,69 @@
+import numpy
+
+
+def growth_rates(effective_years):
+    predicted = 1.009725 + \
+                0.001393539 * effective_years - \
+                0.00005792155 * (effective_years ** 2) + \
+                8.629435e-7 * (effective_years ** 3) - \
+                4.54325e-9 * (effective_years ** 4)
+    return numpy.maximum(1.005, predicted)
+
+
+class Colonies:
+    def __init__(self, planets=(), capacity=64):
+        self.planets = []
+        self._indexes = {}
+        self._founding_year = numpy.zeros(capacity, dtype=numpy.float64)
+        self._population = numpy.zeros(capacity, dtype=numpy.float64)
+        for planet in planets:
+            self.add(planet)
+
+    @classmethod
+    def from_starmap(cls, starmap):
+        # Only look at planets that already exist, uncolonised systems stay ungenerated
+        return cls(p for star in starmap for p in star.existing_planets if p.founding_year is not None)
+
+    def __len__(self):
+        return len(self.planets)
+
+    def __contains__(self, planet):
+        return planet in self._indexes
+
+    @property
+    def founding_year(self):
+        return self._founding_year[:len(self.planets)]
+
+    @property
+    def population(self):
+        return self._population[:len(self.planets)]
+
+    def index(self, planet):
+        return self._indexes[planet]
+
+    def add(self, planet, founding_year=None):
+        if planet in self:
+            return self.index(planet)
+        if founding_year is not None:
+            planet.founding_year = founding_year
+        n = len(self.planets)
+        if n == len(self._population):
+            self._founding_year = numpy.resize(self._founding_year, n * 2)
+            self._population = numpy.resize(self._population, n * 2)
+        self.planets.append(planet)
+        self._indexes[planet] = n
+        self._founding_year[n] = planet.founding_year
+        self._population[n] = planet.population
+        return n
+
+    def grow(self, current_year):
+        population = self.population
+        population *= growth_rates(current_year - self.founding_year)
+        numpy.floor(population, out=population)
+
+    def over(self, threshold):
+        return numpy.flatnonzero(self.population > threshold)
+
+    def sync(self):
+        for planet, population in zip(self.planets, self.population.tolist()):
+            planet.population = int(population)
@@ -0,0 +1,73 @@
+import random
+
+import numpy
+
+import instrumentation
+from query import galaxy_for
+
+
+class Destinations:
+    def __init__(self, stars, planets_by_star):
+        self.stars = stars
+        self.planets_by_star = planets_by_star
+        # Uniform over stars then uniform over that star's habitable planets, flattened per planet
+        self.planets = [p for planets in planets_by_star for p in planets]
+        self.weights = numpy.array([1 / (len(stars) * len(planets)) for planets in planets_by_star for _ in planets])
+        self.weights /= self.weights.sum()
+        self.cumulative_weights = numpy.cumsum(self.weights)
+
+    def __len__(self):
+        return len(self.planets)
+
+    def sample(self, rng=random):
+        return rng.choice(rng.choice(self.planets_by_star))
+
+    def distribute(self, total, rng, chunk=1e6):
+        # Equivalent to sampling a destination independently for every chunk, in a single draw
+        chunks, remainder = divmod(int(total), int(chunk))
+        amounts = rng.multinomial(chunks, self.weights) * chunk
+        if remainder:
+            last = numpy.searchsorted(self.cumulative_weights, rng.random() * self.cumulative_weights[-1], side="right")
+            amounts[min(last, len(amounts) - 1)] += remainder
+        receiving = numpy.flatnonzero(amounts)
+        return [self.planets[i] for i in receiving], amounts[receiving]
+
+
+class HabitableIndex:
+    def __init__(self, starmap, radius=20, network=None):
+        self.starmap = starmap
+        self.radius = radius
+        self.network = network
+        self._habitable = {}
+        self._destinations = {}
+
+    def habitable_planets(self, star):
+        planets = self._habitable.get(star)
+        if planets is None:
+            min_hab, max_hab = star.habitable_zone
+            planets = [p for p in star.planets if min_hab <= p.orbital_distance <= max_hab]
+            self._habitable[star] = planets
+        return planets
+
+    def destinations(self, star):
+        destinations = self._destinations.get(star)
+        if destinations is None:
+            instrumentation.count("neighbour_cache_misses")
+            if self.network is not None:
+                nearby = self.network.neighbours(star)
+            else:
+                nearby = galaxy_for(self.starmap).sphere(star, self.radius).exclude(star)
+            stars = [s for s in nearby if self.habitable_planets(s)]
+            destinations = Destinations(stars, [self.habitable_planets(s) for s in stars])
+            self._destinations[star] = destinations
+        return destinations
+
+    def build(self, stars=None):
+        for star in self.starmap if stars is None else stars:
+            self.destinations(star)
+
+    def invalidate(self, star):
+        self._habitable.pop(star, None)
+        self._destinations.pop(star, None)
+        for neighbour, _ in star.closest_stars(self.starmap, radius=self.radius):
+            self._destinations.pop(neighbour, None)
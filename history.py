@@ -0,0 +1,76 @@
+import json
+import os
+
+import numpy
+
+
+def truncate_history(path, year, source=None):
+    # Drop the years a resumed run is about to simulate again; a branch starts from a copy of its parent's
+    source = path if source is None else source
+    if not os.path.exists(source):
+        return
+    with open(source) as history_file:
+        kept = [line for line in history_file if json.loads(line)["year"] < year]
+    with open(path, "w") as history_file:
+        history_file.writelines(kept)
+
+
+class HistoryRecorder:
+    def __init__(self, starmap, colonies, path, threshold=0.1, append=False):
+        self.colonies = colonies
+        self.threshold = threshold
+        self._seen = 0
+        self._names = {star.hip: star.name for star in starmap}
+        self._reported = numpy.zeros(0)
+        if append:
+            # Carry on from the colonies as they stand, measuring changes against what earlier lines reported
+            self._seen = len(colonies)
+            self._reported = numpy.zeros(len(colonies))
+            indexes = {tuple(self._planet_key(planet)): n for n, planet in enumerate(colonies.planets)}
+            for delta in read_history(path) if os.path.exists(path) else ():
+                for hip, planet, population in delta["population"]:
+                    if (hip, planet) in indexes:
+                        self._reported[indexes[hip, planet]] = population
+        self._file = open(path, "a" if append else "w")
+
+    def _planet_key(self, planet):
+        return [planet.star.hip, planet.index]
+
+    def record(self, current_year):
+        # Colonies only ever get appended, so everything past the last count was settled this year
+        new = self.colonies.planets[self._seen:]
+        population = self.colonies.population
+        reported = numpy.resize(self._reported, len(population))
+        reported[self._seen:] = 0
+
+        changed = numpy.abs(population - reported) > self.threshold * numpy.maximum(reported, 1)
+        changed[self._seen:] = True
+        changed = numpy.flatnonzero(changed)
+
+        delta = {
+            "year": current_year,
+            "colonised": [self._planet_key(p) + [p.star.position, p.founding_year] for p in new],
+            "renamed": [],
+            "population": [self._planet_key(self.colonies.planets[i]) + [float(population[i])] for i in changed],
+        }
+        for planet in new:
+            star = planet.star
+            if self._names.get(star.hip) != star.name:
+                delta["renamed"].append([star.hip, star.name])
+            self._names[star.hip] = star.name
+
+        reported[changed] = population[changed]
+        self._reported = reported
+        self._seen = len(self.colonies)
+        self._file.write(json.dumps(delta) + "\n")
+        return delta
+
+    def close(self):
+        self._file.close()
+
+
+def read_history(path):
+    with open(path) as history_file:
+        for line in history_file:
+            if line.strip():
+                yield json.loads(line)
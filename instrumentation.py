@@ -0,0 +1,147 @@
+import cProfile
+import csv
+import json
+import os
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+
+
+class NullInstrumentation:
+    enabled = False
+    _context = nullcontext()
+
+    def phase(self, name):
+        return self._context
+
+    def count(self, name, n=1):
+        pass
+
+    def start_year(self, year):
+        pass
+
+    def end_year(self):
+        pass
+
+    def merge(self, timings, counters):
+        pass
+
+    def totals(self):
+        return {}, {}
+
+
+class _Phase:
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.timings[self.name] += time.perf_counter() - self.start
+
+
+class Instrumentation:
+    enabled = True
+
+    def __init__(self, profile_years=None, profile_path="simulation.prof"):
+        self.years = []
+        self.profile_years = profile_years
+        self.profile_path = profile_path
+        self._profile = None
+        self._year = None
+        self._timings = defaultdict(float)
+        self._counters = defaultdict(int)
+        self._started = None
+
+    def phase(self, name):
+        return _Phase(self._timings, name)
+
+    def count(self, name, n=1):
+        self._counters[name] += n
+
+    def merge(self, timings, counters):
+        # Folds in what a worker process measured; its timings add up CPU time across processes
+        for name, value in timings.items():
+            self._timings[name] += value
+        for name, value in counters.items():
+            self._counters[name] += value
+
+    def totals(self):
+        # What the current year has measured so far, as plain dicts another process can send back
+        return dict(self._timings), dict(self._counters)
+
+    def start_year(self, year):
+        self._year = year
+        self._timings = defaultdict(float)
+        self._counters = defaultdict(int)
+        if self.profile_years is not None and self.profile_years[0] <= year <= self.profile_years[1]:
+            if self._profile is None:
+                self._profile = cProfile.Profile()
+            self._profile.enable()
+        self._started = time.perf_counter()
+
+    def end_year(self):
+        total = time.perf_counter() - self._started
+        if self._profile is not None:
+            self._profile.disable()
+            if self._year >= self.profile_years[1]:
+                self._profile.dump_stats(self.profile_path)
+                self._profile = None
+        summary = {"year": self._year, "total": total}
+        summary.update(("time_" + name, value) for name, value in self._timings.items())
+        summary.update(self._counters)
+        self.years.append(summary)
+        return summary
+
+    def to_json(self, path):
+        with open(path, "w") as out_file:
+            json.dump(self.years, out_file, indent=2)
+
+    def to_csv(self, path):
+        columns = ["year", "total"]
+        for summary in self.years:
+            columns.extend(key for key in summary if key not in columns)
+        with open(path, "w", newline="") as out_file:
+            writer = csv.DictWriter(out_file, columns, restval=0)
+            writer.writeheader()
+            writer.writerows(self.years)
+
+    def write(self, path):
+        if path.endswith(".csv"):
+            self.to_csv(path)
+        else:
+            self.to_json(path)
+
+
+_active = NullInstrumentation()
+
+
+def install(instrumentation):
+    global _active
+    _active = instrumentation
+    return instrumentation
+
+
+def active():
+    return _active
+
+
+def phase(name):
+    return _active.phase(name)
+
+
+def count(name, n=1):
+    _active.count(name, n)
+
+
+def from_environment():
+    # STARMAP_INSTRUMENT=summary.csv turns timing on, STARMAP_PROFILE_YEARS=150-160 adds cProfile for that range
+    if not os.environ.get("STARMAP_INSTRUMENT"):
+        return install(NullInstrumentation())
+    profile_years = os.environ.get("STARMAP_PROFILE_YEARS")
+    if profile_years:
+        start, _, end = profile_years.partition("-")
+        profile_years = int(start), int(end or start)
+    return install(Instrumentation(profile_years))
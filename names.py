@@ -0,0 +1,123 @@
+import random
+from bisect import bisect
+from collections import Counter, defaultdict
+from itertools import accumulate
+
+import instrumentation
+
+ORDER = 3
+MIN_LENGTH = 3
+# Stop drawing Markov names once a candidate has collided this often and number the last one instead
+ATTEMPTS = 100
+NUMERALS = [(1000, "M"), (900, "CM"), (500, "D"), (400, "CD"), (100, "C"), (90, "XC"),
+            (50, "L"), (40, "XL"), (10, "X"), (9, "IX"), (5, "V"), (4, "IV"), (1, "I")]
+
+
+def roman(n):
+    out = ""
+    for value, numeral in NUMERALS:
+        while n >= value:
+            out += numeral
+            n -= value
+    return out
+
+
+class NameGenerator:
+    def __init__(self, starnames, used=None):
+        transitions = defaultdict(Counter)
+        for name in starnames:
+            for n, char in enumerate(name):
+                transitions[name[max(0, n - ORDER):n]][char] += 1
+            transitions[name[-ORDER:]][None] += 1
+
+        # Each context maps to (characters, cumulative weights, total); None ends the name. Short contexts
+        # get a second table without the end so names under MIN_LENGTH are never drawn
+        self._tables = {}
+        self._short_tables = {}
+        for context, counts in transitions.items():
+            self._tables[context] = self._table(counts)
+            if len(context) < MIN_LENGTH and None in counts and len(counts) > 1:
+                self._short_tables[context] = self._table({char: n for char, n in counts.items() if char is not None})
+        self.max_length = max(len(name) for name in starnames)
+        self.used = set() if used is None else used
+        self.used_probability = 0.0
+        self._capacity = None
+
+    @staticmethod
+    def _table(counts):
+        chars = sorted(counts, key=lambda char: (char is None, char))
+        cumulative = list(accumulate(counts[char] for char in chars))
+        return chars, cumulative, cumulative[-1]
+
+    def _lookup(self, name):
+        context = name[-ORDER:]
+        if len(name) < MIN_LENGTH and context in self._short_tables:
+            return self._short_tables[context]
+        return self._tables.get(context)
+
+    def draw(self, rng=random):
+        name = ""
+        while True:
+            chars, cumulative, total = self._lookup(name)
+            char = chars[bisect(cumulative, rng.random() * total)]
+            if char is None:
+                return name.title()
+            name += char
+
+    def probability(self, name):
+        name = name.lower()
+        p = 1.0
+        for n, char in enumerate(list(name) + [None]):
+            table = self._lookup(name[:n])
+            if table is None or char not in table[0]:
+                return 0.0
+            i = table[0].index(char)
+            p *= (table[1][i] - (table[1][i - 1] if i else 0)) / table[2]
+        return p
+
+    def __contains__(self, name):
+        return name in self.used
+
+    def claim(self, name):
+        self.used.add(name)
+        self.used_probability += self.probability(name)
+        return name
+
+    def name(self, rng=random):
+        for _ in range(ATTEMPTS):
+            name = self.draw(rng)
+            if name not in self.used:
+                return self.claim(name)
+            instrumentation.count("star_name_retries")
+        # Numbering the last draw keeps names unique however full the Markov space gets
+        instrumentation.count("star_name_fallbacks")
+        n = 2
+        while "{} {}".format(name, roman(n)) in self.used:
+            n += 1
+        return self.claim("{} {}".format(name, roman(n)))
+
+    def names(self, count, rng=random):
+        return [self.name(rng) for _ in range(count)]
+
+    @property
+    def capacity(self):
+        # Number of distinct names the chain can spell up to the longest source name, counted by walking
+        # contexts rather than strings
+        if self._capacity is None:
+            total = 0
+            states = {"": 1}
+            for _ in range(self.max_length + 1):
+                following = defaultdict(int)
+                for context, paths in states.items():
+                    for char in self._lookup(context)[0]:
+                        if char is None:
+                            total += paths
+                        else:
+                            following[(context + char)[-ORDER:]] += paths
+                states = following
+            self._capacity = total
+        return self._capacity
+
+    def remaining(self):
+        return {"names": max(self.capacity - len(self.used), 0), "used": len(self.used),
+                "expected_draws": 1 / max(1 - self.used_probability, 1e-12)}
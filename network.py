@@ -0,0 +1,97 @@
+from collections import deque
+
+import numpy
+
+from spatial import SpatialIndex
+from stellar_obj import generate_planets
+
+
+class ColonisationNetwork:
+    def __init__(self, starmap, habitable, radius=20):
+        # Nodes are every system colonists could settle, plus Sol; edges join systems within the jump radius
+        generate_planets(starmap)
+        self.starmap = starmap
+        self.radius = radius
+        self.stars = [star for n, star in enumerate(starmap) if n == 0 or habitable.habitable_planets(star)]
+        self.nodes = {star: n for n, star in enumerate(self.stars)}
+
+        index = SpatialIndex(range(len(self.stars)), position=lambda n: self.stars[n].position)
+        neighbours, distances = [], []
+        for n, star in enumerate(self.stars):
+            found = [(m, d) for m, d in index.within(star.position, radius) if m != n]
+            neighbours.append([m for m, _ in found])
+            distances.append([d for _, d in found])
+
+        # CSR: the neighbours of node n are indices[indptr[n]:indptr[n + 1]], nearest first
+        self.indptr = numpy.zeros(len(self.stars) + 1, dtype=numpy.int64)
+        numpy.cumsum([len(found) for found in neighbours], out=self.indptr[1:])
+        self.indices = numpy.array([m for found in neighbours for m in found], dtype=numpy.int64)
+        self.distances = numpy.array([d for found in distances for d in found], dtype=numpy.float64)
+        self._colonised = numpy.zeros(len(self.stars), dtype=bool)
+        self._seen = 0
+
+    def __len__(self):
+        return len(self.stars)
+
+    @property
+    def edges(self):
+        return len(self.indices)
+
+    def neighbours(self, star):
+        n = self.nodes.get(star)
+        if n is None:
+            return []
+        return [self.stars[m] for m in self.indices[self.indptr[n]:self.indptr[n + 1]].tolist()]
+
+    def _sources(self):
+        return numpy.repeat(numpy.arange(len(self.stars)), numpy.diff(self.indptr))
+
+    def components(self):
+        labels = numpy.full(len(self.stars), -1, dtype=numpy.int64)
+        indptr, indices = self.indptr.tolist(), self.indices.tolist()
+        component = 0
+        for start in range(len(self.stars)):
+            if labels[start] >= 0:
+                continue
+            labels[start] = component
+            queue = deque([start])
+            while queue:
+                n = queue.popleft()
+                for m in indices[indptr[n]:indptr[n + 1]]:
+                    if labels[m] < 0:
+                        labels[m] = component
+                        queue.append(m)
+            component += 1
+        return labels
+
+    def hops(self, source=None):
+        # Breadth-first from Sol by default; -1 marks systems colonists can never reach
+        hops = numpy.full(len(self.stars), -1, dtype=numpy.int64)
+        start = 0 if source is None else self.nodes[source]
+        hops[start] = 0
+        frontier = numpy.array([start])
+        sources = self._sources()
+        while len(frontier):
+            reached = numpy.zeros(len(self.stars), dtype=bool)
+            reached[frontier] = True
+            step = numpy.unique(self.indices[reached[sources]])
+            step = step[hops[step] < 0]
+            hops[step] = hops[frontier[0]] + 1
+            frontier = step
+        return hops
+
+    def colonised(self, colonies):
+        # Colonies are only ever appended, so just mark the ones added since the last call
+        new = colonies.planets[self._seen:]
+        self._colonised[[self.nodes[planet.star] for planet in new if planet.star in self.nodes]] = True
+        self._seen = len(colonies)
+        return self._colonised
+
+    def frontier(self, colonised):
+        # Colonised systems with at least one neighbour nobody has settled yet
+        sources = self._sources()
+        open_edges = colonised[sources] & ~colonised[self.indices]
+        return numpy.flatnonzero(numpy.bincount(sources[open_edges], minlength=len(self.stars)) > 0)
+
+    def frontier_stars(self, colonies):
+        return [self.stars[n] for n in self.frontier(self.colonised(colonies)).tolist()]
@@ -0,0 +1,160 @@
+import multiprocessing
+from collections import defaultdict
+from multiprocessing import shared_memory
+
+import numpy
+
+import catalogue
+import instrumentation
+from growth import growth_rates
+from habitability import HabitableIndex
+from query import galaxy_for
+from spatial import index_for
+from star_table import StarTable
+from stellar_obj import Planet, generate_planets
+
+# Filled in by the parent before the pool forks, so workers inherit the galaxy instead of unpickling it
+_WORKER = {}
+
+
+class SharedArray:
+    def __init__(self, values):
+        self.memory = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        self.array = numpy.ndarray(values.shape, values.dtype, buffer=self.memory.buf)
+        self.array[:] = values
+
+    def close(self):
+        del self.array
+        self.memory.close()
+        self.memory.unlink()
+
+
+def partition(table, cell_size, parts):
+    # Bin stars into cubic cells, then hand out whole cells largest first to the emptiest part
+    cells = numpy.floor(table.positions / cell_size).astype(numpy.int64)
+    _, cell_ids = numpy.unique(cells, axis=0, return_inverse=True)
+    cell_ids = cell_ids.ravel()
+    sizes = numpy.bincount(cell_ids)
+    loads = [0] * parts
+    owner = numpy.zeros(len(sizes), dtype=numpy.int64)
+    for cell in numpy.argsort(-sizes, kind="stable"):
+        part = loads.index(min(loads))
+        owner[cell] = part
+        loads[part] += sizes[cell]
+    star_parts = owner[cell_ids]
+    return [numpy.flatnonzero(star_parts == part) for part in range(parts)]
+
+
+def _simulate_part(part, current_year, seed, instrumented=False):
+    # The worker's copy of the parent's instrumentation never makes it back, so measure into a fresh one
+    instruments = instrumentation.install(
+        instrumentation.Instrumentation() if instrumented else instrumentation.NullInstrumentation())
+    starmap = _WORKER["starmap"]
+    owner = _WORKER["owner"]
+    store = starmap[0]._store
+    population = store.population
+    founding_year = store.founding_year
+    owned = _WORKER["part_planets"][part]
+    if "habitable" not in _WORKER:
+        _WORKER["habitable"] = HabitableIndex(starmap, _WORKER["radius"], _WORKER["network"])
+    habitable = _WORKER["habitable"]
+
+    with instruments.phase("growth"):
+        colonised = owned[~numpy.isnan(founding_year[owned])]
+        grown = population[colonised]
+        grown *= growth_rates(current_year - founding_year[colonised])
+        numpy.floor(grown, out=grown)
+        population[colonised] = grown
+
+    arrivals = defaultdict(float)
+    for source in colonised[grown > 1e8].tolist():
+        colonists, destination_planets, amounts = catalogue.emigrate(
+            habitable, Planet(starmap[owner[source]], source), population[source], current_year, seed)
+        population[source] -= colonists
+        for destination_planet, amount in zip(destination_planets, amounts.tolist()):
+            arrivals[destination_planet._index] += amount
+
+    # Arrivals inside this part are settled here, anything crossing into another part goes back to the parent
+    planet_part = _WORKER["planet_part"]
+    founded, remote = [], []
+    for destination, amount in arrivals.items():
+        if planet_part[destination] != part:
+            remote.append((destination, amount))
+            continue
+        if numpy.isnan(founding_year[destination]):
+            founding_year[destination] = current_year
+            founded.append(destination)
+        population[destination] += amount
+    return (founded, remote) + instruments.totals()
+
+
+class ParallelSimulation:
+    def __init__(self, starmap, colonies, seed, processes=None, cell_size=100, radius=20, network=None):
+        processes = processes or multiprocessing.cpu_count()
+        self.starmap = starmap
+        self.colonies = colonies
+        self.seed = seed
+        self.network = network
+
+        # Planets are addressed by their index in the galaxy's PlanetStore; its population and founding year
+        # columns move into shared memory for the run, so workers update them in place
+        generate_planets(starmap)
+        self.store = store = starmap[0]._store
+        self.owner = galaxy_for(starmap).planet_owner()
+        planet_part = numpy.full(store.size, -1, dtype=numpy.int64)
+        part_planets = []
+        for part, rows in enumerate(partition(StarTable.for_stars(starmap), cell_size, processes * 4)):
+            owned = numpy.concatenate([numpy.arange(starmap[row]._planet_start,
+                                                    starmap[row]._planet_start + starmap[row]._planet_count)
+                                       for row in rows.tolist()] or [numpy.zeros(0, dtype=numpy.int64)])
+            planet_part[owned] = part
+            part_planets.append(owned)
+
+        self.population = SharedArray(store.population)
+        self.founding_year = SharedArray(store.founding_year)
+        store.population, store.founding_year = self.population.array, self.founding_year.array
+        self.parts = len(part_planets)
+        self._colony_ids = [planet._index for planet in colonies.planets]
+
+        index_for(starmap)
+        _WORKER.update(starmap=starmap, owner=self.owner, radius=radius, network=network,
+                       part_planets=part_planets, planet_part=planet_part)
+        self.pool = multiprocessing.get_context("fork").Pool(processes)
+
+    def simulate_year(self, current_year):
+        instruments = instrumentation.active()
+        instruments.start_year(current_year)
+        instruments.count("planets_grown", len(self.colonies))
+        with instruments.phase("parallel"):
+            results = self.pool.starmap(_simulate_part, [(part, current_year, self.seed, instruments.enabled)
+                                                         for part in range(self.parts)])
+
+        population = self.store.population
+        founding_year = self.store.founding_year
+        founded = []
+        for local, remote, timings, counters in results:
+            instruments.merge(timings, counters)
+            founded.extend(local)
+            for destination, amount in remote:
+                if numpy.isnan(founding_year[destination]):
+                    founding_year[destination] = current_year
+                    founded.append(destination)
+                population[destination] += amount
+
+        new_colonies = sorted((Planet(self.starmap[self.owner[n]], n) for n in founded), key=catalogue.planet_key)
+        for planet in new_colonies:
+            self.colonies.add(planet, current_year)
+            self._colony_ids.append(planet._index)
+        catalogue.name_colonies(new_colonies, self.seed)
+        self.colonies.population[:] = population[self._colony_ids]
+        catalogue.count_frontier(self.network, self.colonies)
+        instruments.end_year()
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+        _WORKER.clear()
+        # The store outlives the run, so give it private copies before the shared memory goes
+        self.store.population, self.store.founding_year = self.population.array.copy(), self.founding_year.array.copy()
+        self.population.close()
+        self.founding_year.close()
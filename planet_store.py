@@ -0,0 +1,64 @@
+import numpy
+
+
+class PlanetStore:
+    def __init__(self, capacity=1024, seed=0):
+        self.seed = seed
+        self.size = 0
+        self.orbital_distance = numpy.zeros(capacity, dtype=numpy.float64)
+        self.population = numpy.zeros(capacity, dtype=numpy.float64)
+        self.founding_year = numpy.full(capacity, numpy.nan, dtype=numpy.float64)
+        self.rocky = numpy.zeros(capacity, dtype=bool)
+        self.name = numpy.full(capacity, -1, dtype=numpy.int32)
+        self.names = []
+
+    @classmethod
+    def from_arrays(cls, orbital_distance, rocky, population, founding_year, names, seed=0):
+        store = cls(max(len(orbital_distance), 1), seed)
+        store.extend(orbital_distance, rocky, population, founding_year, names)
+        return store
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, column).nbytes
+                   for column in ("orbital_distance", "population", "founding_year", "rocky", "name"))
+
+    def _reserve(self, count):
+        needed = self.size + count
+        capacity = len(self.orbital_distance)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for column in ("orbital_distance", "population", "founding_year", "rocky", "name"):
+            old = getattr(self, column)
+            new = numpy.empty(capacity, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, column, new)
+
+    def extend(self, orbital_distance, rocky, population=None, founding_year=None, names=None):
+        count = len(orbital_distance)
+        self._reserve(count)
+        start, end = self.size, self.size + count
+        self.orbital_distance[start:end] = orbital_distance
+        self.rocky[start:end] = rocky
+        self.population[start:end] = 0 if population is None else population
+        if founding_year is None:
+            self.founding_year[start:end] = numpy.nan
+        elif isinstance(founding_year, numpy.ndarray):
+            self.founding_year[start:end] = founding_year
+        else:
+            self.founding_year[start:end] = [numpy.nan if year is None else year for year in founding_year]
+        self.name[start:end] = -1
+        for n, name in enumerate(names or []):
+            if name:
+                self.name[start + n] = len(self.names)
+                self.names.append(name)
+        self.size = end
+        return start
+
+    def populated(self, start, count):
+        return bool(numpy.any(self.population[start:start + count] > 0))
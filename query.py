@@ -0,0 +1,188 @@
+import math
+
+import numpy
+
+from spatial import index_for
+from star_table import StarTable
+from stellar_obj import CLASS_LETTERS
+
+
+class Galaxy:
+    def __init__(self, starmap, colonies=None):
+        self.starmap = starmap
+        self.colonies = colonies
+        self.table = StarTable.for_stars(starmap)
+        # Rows of each spectral letter, so class filters never look at the rest of the galaxy
+        letters = self.table.class_code // 10
+        self._class_rows = {letter: numpy.flatnonzero(letters == n) for n, letter in enumerate(CLASS_LETTERS)}
+        self._owner = numpy.zeros(0, dtype=numpy.int64)
+        self._owned = 0
+        self._colony_rows = numpy.zeros(0, dtype=numpy.int64)
+
+    def __len__(self):
+        return len(self.starmap)
+
+    def query(self):
+        return Query(self)
+
+    def sphere(self, centre, radius):
+        return self.query().sphere(centre, radius)
+
+    def box(self, lower, upper):
+        return self.query().box(lower, upper)
+
+    def cone(self, direction, angle, radius=math.inf):
+        return self.query().cone(direction, angle, radius)
+
+    def planet_owner(self):
+        # Store index -> star row, rebuilt only when systems have been generated since the last query
+        store = self.starmap[0]._store
+        if self._owned != store.size:
+            owner = numpy.full(store.size, -1, dtype=numpy.int64)
+            for row, star in enumerate(self.starmap):
+                owner[star._planet_start:star._planet_start + star._planet_count] = row
+            self._owner = owner
+            self._owned = store.size
+        return self._owner
+
+    def _colony_star_rows(self):
+        planets = self.colonies.planets
+        if len(self._colony_rows) != len(planets):
+            added = [planet.star._row for planet in planets[len(self._colony_rows):]]
+            self._colony_rows = numpy.concatenate([self._colony_rows, numpy.array(added, dtype=numpy.int64)])
+        return self._colony_rows
+
+    def population(self):
+        # Colonies hold the live numbers during a run, the store only catches up on sync
+        if self.colonies is not None:
+            return numpy.bincount(self._colony_star_rows(), weights=self.colonies.population, minlength=len(self))
+        owner = self.planet_owner()
+        owned = owner >= 0
+        store = self.starmap[0]._store
+        return numpy.bincount(owner[owned], weights=store.population[:store.size][owned], minlength=len(self))
+
+    def founding_year(self):
+        owner = self.planet_owner()
+        store = self.starmap[0]._store
+        founded = (owner >= 0) & ~numpy.isnan(store.founding_year[:store.size])
+        first = numpy.full(len(self), numpy.nan)
+        numpy.fmin.at(first, owner[founded], store.founding_year[:store.size][founded])
+        return first
+
+    def habitable(self, row):
+        star = self.starmap[row]
+        min_hab, max_hab = star.habitable_zone
+        orbits = star._store.orbital_distance[star._planet_start:star._planet_start + len(star.planets)]
+        return bool(numpy.any((orbits >= min_hab) & (orbits <= max_hab)))
+
+
+class Query:
+    def __init__(self, galaxy, candidates=None, masks=(), checks=()):
+        self.galaxy = galaxy
+        self._candidates = candidates
+        self._masks = masks
+        self._checks = checks
+
+    def _with(self, candidates=None, mask=None, check=None):
+        if candidates is not None and self._candidates is not None:
+            candidates = self._candidates[numpy.isin(self._candidates, candidates)]
+        return Query(self.galaxy, self._candidates if candidates is None else candidates,
+                     self._masks + ((mask,) if mask else ()), self._checks + ((check,) if check else ()))
+
+    def _position(self, point):
+        return point.position if hasattr(point, "position") else tuple(point)
+
+    def sphere(self, centre, radius):
+        # Candidates come from the shared grid index, nearest first
+        found = index_for(self.galaxy.starmap).within(self._position(centre), radius)
+        return self._with(candidates=numpy.array([star._row for star, _ in found], dtype=numpy.int64))
+
+    def box(self, lower, upper):
+        table = self.galaxy.table
+
+        def mask():
+            inside = numpy.ones(len(table), dtype=bool)
+            for column, low, high in zip((table.x, table.y, table.z), lower, upper):
+                inside &= (column >= low) & (column <= high)
+            return inside
+        return self._with(mask=mask)
+
+    def cone(self, direction, angle, radius=math.inf):
+        # Stars within angle (degrees) of the line of sight from Sol towards direction
+        direction = numpy.asarray(self._position(direction), dtype=numpy.float64)
+        direction /= numpy.linalg.norm(direction)
+        table = self.galaxy.table
+
+        def mask():
+            positions = table.positions
+            distance = numpy.linalg.norm(positions, axis=1)
+            cosine = positions @ direction / numpy.maximum(distance, 1e-12)
+            return (distance <= radius) & ((cosine >= math.cos(math.radians(angle))) | (distance == 0))
+        return self._with(mask=mask)
+
+    def stellar_class(self, *letters):
+        rows = numpy.concatenate([self.galaxy._class_rows[letter.upper()] for letter in letters])
+
+        def mask():
+            matches = numpy.zeros(len(self.galaxy), dtype=bool)
+            matches[rows] = True
+            return matches
+        return self._with(mask=mask)
+
+    def population(self, minimum=1, maximum=math.inf):
+        def mask():
+            population = self.galaxy.population()
+            return (population >= minimum) & (population <= maximum)
+        return self._with(mask=mask)
+
+    def inhabited(self):
+        return self.population(1)
+
+    def founded(self, after=-math.inf, before=math.inf):
+        def mask():
+            founding_year = self.galaxy.founding_year()
+            return (founding_year >= after) & (founding_year <= before)
+        return self._with(mask=mask)
+
+    def habitable(self):
+        # Needs the planets themselves, so it runs star by star after every cheaper filter
+        return self._with(check=self.galaxy.habitable)
+
+    def exclude(self, *stars):
+        rows = {star._row for star in stars}
+        return self._with(check=lambda row: row not in rows)
+
+    def where(self, predicate):
+        return self._with(check=lambda row: predicate(self.galaxy.starmap[row]))
+
+    def mask(self):
+        keep = numpy.zeros(len(self.galaxy), dtype=bool)
+        keep[list(self.rows())] = True
+        return keep
+
+    def rows(self):
+        keep = None
+        for mask in self._masks:
+            keep = mask() if keep is None else keep & mask()
+        rows = numpy.arange(len(self.galaxy)) if self._candidates is None else self._candidates
+        if keep is not None:
+            rows = rows[keep[rows]]
+        for row in rows.tolist():
+            if all(check(row) for check in self._checks):
+                yield row
+
+    def __iter__(self):
+        starmap = self.galaxy.starmap
+        return (starmap[row] for row in self.rows())
+
+    def count(self):
+        return sum(1 for _ in self.rows())
+
+
+def galaxy_for(starmap, colonies=None):
+    # Kept on the galaxy's StarTable alongside its spatial index, and freed with it
+    table = StarTable.for_stars(starmap)
+    cached = table.galaxy
+    if cached is None or cached.starmap is not starmap or cached.colonies is not colonies:
+        cached = table.galaxy = Galaxy(starmap, colonies)
+    return cached
@@ -0,0 +1,93 @@
+import numpy
+from PIL import Image, ImageDraw
+
+BATCH_SIZE = 16384
+ELLIPSE_BIAS = 0.4
+
+
+class Projection:
+    def __init__(self, radius, size):
+        self.radius = radius
+        self.size = size
+        self.border = size * .125
+        self.inner = size * .75
+        self.inner_half = self.inner / 2
+        self.midpoint = size * .5
+
+    def __call__(self, x, y, z):
+        sx = self.midpoint + self.inner_half * (x / self.radius)
+        plane_sy = self.midpoint + self.inner_half * (y / self.radius / 2)
+        sy = plane_sy + self.inner_half * (z / self.radius)
+        star_size = (y + self.radius) / (self.radius * 2) * 3.5 + 0.5
+        return sx, sy, star_size
+
+    @property
+    def plane(self):
+        return ((self.border, self.border + self.inner * .25),
+                (self.border + self.inner, self.border + self.inner * .75))
+
+
+def _offsets(radius):
+    r = int(numpy.ceil(radius)) + 1
+    dy, dx = numpy.mgrid[-r:r + 1, -r:r + 1]
+    return dx.ravel(), dy.ravel()
+
+
+def splat(buffer, sx, sy, star_size, colours, origin=(0, 0)):
+    # Approximates ImageDraw.ellipse on the floored bounding box; odd pixels at a disc's rim can differ.
+    # Later stars paint over earlier ones, as if drawn one at a time
+    height, width = buffer.shape[:2]
+    ox, oy = origin
+    left = numpy.floor(numpy.asarray(sx) - star_size) - ox
+    right = numpy.floor(numpy.asarray(sx) + star_size) - ox
+    top = numpy.floor(numpy.asarray(sy) - star_size) - oy
+    bottom = numpy.floor(numpy.asarray(sy) + star_size) - oy
+    visible = (right >= 0) & (left < width) & (bottom >= 0) & (top < height)
+    order = numpy.flatnonzero(visible)
+
+    for start in range(0, len(order), BATCH_SIZE):
+        batch = order[start:start + BATCH_SIZE]
+        cx = ((left[batch] + right[batch]) / 2)[:, None]
+        cy = ((top[batch] + bottom[batch]) / 2)[:, None]
+        rx = ((right[batch] - left[batch]) / 2 + ELLIPSE_BIAS)[:, None]
+        ry = ((bottom[batch] - top[batch]) / 2 + ELLIPSE_BIAS)[:, None]
+        dx, dy = _offsets(max(rx.max(), ry.max()))
+        px = numpy.floor(cx).astype(numpy.int64) + dx
+        py = numpy.floor(cy).astype(numpy.int64) + dy
+        inside = ((px - cx) / rx) ** 2 + ((py - cy) / ry) ** 2 <= 1
+        inside &= (px >= 0) & (px < width) & (py >= 0) & (py < height)
+        rows, _ = numpy.nonzero(inside)
+        py, px = py[inside], px[inside]
+        # NumPy leaves the winner of repeated indices undefined, so keep only each pixel's last star
+        _, last = numpy.unique((py * width + px)[::-1], return_index=True)
+        last = len(rows) - 1 - last
+        buffer[py[last], px[last]] = colours[batch[rows[last]]]
+
+
+def render_tile(projection, x, y, z, colours, background, origin, tile_size, plane_colour=None):
+    width, height = tile_size
+    buffer = numpy.empty((height, width, 4), dtype=numpy.uint8)
+    buffer[:] = background
+    if plane_colour is not None:
+        tile = Image.fromarray(buffer, "RGBA")
+        (left, top), (right, bottom) = projection.plane
+        ImageDraw.Draw(tile).ellipse(((left - origin[0], top - origin[1]), (right - origin[0], bottom - origin[1])),
+                                     outline=plane_colour)
+        buffer = numpy.asarray(tile).copy()
+    sx, sy, star_size = projection(x, y, z)
+    splat(buffer, sx, sy, star_size, colours, origin)
+    return Image.fromarray(buffer, "RGBA")
+
+
+def render_tiles(projection, x, y, z, colours, background, tile_size=2048, plane_colour=None):
+    for top in range(0, projection.size, tile_size):
+        for left in range(0, projection.size, tile_size):
+            size = (min(tile_size, projection.size - left), min(tile_size, projection.size - top))
+            yield (left, top), render_tile(projection, x, y, z, colours, background, (left, top), size, plane_colour)
+
+
+def render(projection, x, y, z, colours, background, tile_size=2048, plane_colour=None):
+    image = Image.new("RGBA", (projection.size, projection.size), tuple(background))
+    for origin, tile in render_tiles(projection, x, y, z, colours, background, tile_size, plane_colour):
+        image.paste(tile, origin)
+    return image
@@ -0,0 +1,210 @@
+import json
+import os
+
+import numpy
+
+from planet_store import PlanetStore
+from star_table import StarTable, cartesian, class_codes
+from stellar_obj import Star
+
+MAGIC = b"STARMAP2"
+ALIGNMENT = 64
+
+STAR_DTYPE = numpy.dtype([
+    ("hip", "<i8"),
+    ("rect_ascension", "<f8"),
+    ("declination", "<f8"),
+    ("distance", "<f8"),
+    ("name_offset", "<u8"),
+    ("name_length", "<u4"),
+    ("class_offset", "<u8"),
+    ("class_length", "<u4"),
+    ("planet_start", "<u8"),
+    ("planet_count", "<u4"),
+    ("x", "<f8"),
+    ("y", "<f8"),
+    ("z", "<f8"),
+    ("class_code", "i1"),
+])
+
+PLANET_DTYPE = numpy.dtype([
+    ("star", "<u4"),
+    ("orbital_distance", "<f8"),
+    ("population", "<f8"),
+    ("founding_year", "<f8"),
+    ("rocky", "u1"),
+    ("name_offset", "<u8"),
+    ("name_length", "<u4"),
+])
+
+# Recorded in every header, so a reader never views records through a layout they weren't written with
+LAYOUT = json.loads(json.dumps({"stars": STAR_DTYPE.descr, "planets": PLANET_DTYPE.descr}))
+
+
+class StringTable:
+    def __init__(self):
+        self._chunks = []
+        self._offsets = {}
+        self.size = 0
+
+    def add(self, string):
+        if not string:
+            return 0, 0
+        encoded = string.encode("utf-8")
+        if encoded not in self._offsets:
+            self._offsets[encoded] = self.size
+            self._chunks.append(encoded)
+            self.size += len(encoded)
+        return self._offsets[encoded], len(encoded)
+
+    def to_bytes(self):
+        return b"".join(self._chunks)
+
+
+def _pad(position):
+    return -position % ALIGNMENT
+
+
+def _settled(planet):
+    return planet.founding_year is not None or planet.population > 0 or planet._name is not None
+
+
+def star_record(star, settled_only=False):
+    # Planets are regenerated from (seed, HIP) on demand, so settled_only can leave out untouched systems
+    if settled_only:
+        planets = star.existing_planets
+        if not any(_settled(planet) for planet in planets):
+            planets = []
+    else:
+        planets = star.planets
+    return {
+        "HIP": star.hip,
+        "name": star.name,
+        "rectascension": star.rect_ascension,
+        "declination": star.declination,
+        "distance": star.distance,
+        "stellar_class": star._stellar_class,
+        "planets": [{"orbital_distance": planet.orbital_distance, "population": planet.population,
+                     "founding_year": planet.founding_year, "rocky": planet.rocky, "name": planet._name}
+                    for planet in planets],
+    }
+
+
+class SnapshotWriter:
+    def __init__(self, path, seed=0):
+        self.path = path
+        self.seed = seed
+        self._strings = StringTable()
+        self._stars = []
+        self._planets = []
+        self._classes = []
+
+    def add(self, record):
+        row = len(self._stars)
+        strings = self._strings
+        self._stars.append((record["HIP"], record["rectascension"], record["declination"], record["distance"],
+                            *strings.add(record["name"]), *strings.add(record["stellar_class"]),
+                            len(self._planets), len(record["planets"])))
+        self._classes.append(record["stellar_class"] or "")
+        for planet in record["planets"]:
+            self._planets.append((row, planet["orbital_distance"], planet["population"],
+                                  numpy.nan if planet["founding_year"] is None else planet["founding_year"],
+                                  planet["rocky"], *strings.add(planet["name"])))
+
+    def close(self):
+        stars = numpy.zeros(len(self._stars), dtype=STAR_DTYPE)
+        columns = STAR_DTYPE.names[:10]
+        if self._stars:
+            stars[list(columns)] = numpy.array(self._stars, dtype=[(name, STAR_DTYPE[name]) for name in columns])
+        # Fixed-width class codes and positions let readers build a StarTable without decoding strings
+        stars["x"], stars["y"], stars["z"] = cartesian(stars["rect_ascension"], stars["declination"], stars["distance"])
+        stars["class_code"] = class_codes(self._classes)
+        planets = numpy.array(self._planets, dtype=PLANET_DTYPE)
+        blocks = [("stars", stars.tobytes()), ("planets", planets.tobytes()), ("strings", self._strings.to_bytes())]
+
+        # Offsets depend on the header length, so lay the blocks out relative to the end of a padded header
+        header = {"stars": len(stars), "planets": len(planets), "seed": self.seed, "layout": LAYOUT, "blocks": {}}
+        relative = 0
+        for name, data in blocks:
+            header["blocks"][name] = [relative, len(data)]
+            relative += len(data) + _pad(len(data))
+        encoded = json.dumps(header).encode("utf-8")
+        start = len(MAGIC) + 8 + len(encoded)
+        start += _pad(start)
+
+        # Written beside the target and moved over it, so readers never see half a snapshot
+        with open(self.path + ".tmp", "wb") as snapshot_file:
+            snapshot_file.write(MAGIC)
+            snapshot_file.write(len(encoded).to_bytes(8, "little"))
+            snapshot_file.write(encoded)
+            snapshot_file.write(b"\0" * (start - snapshot_file.tell()))
+            for name, data in blocks:
+                snapshot_file.write(data)
+                snapshot_file.write(b"\0" * _pad(len(data)))
+        os.replace(self.path + ".tmp", self.path)
+
+
+def write_snapshot(path, starmap, settled_only=False):
+    writer = SnapshotWriter(path, starmap[0]._store.seed if starmap else 0)
+    for star in starmap:
+        writer.add(star_record(star, settled_only))
+    writer.close()
+
+
+class Snapshot:
+    def __init__(self, path):
+        self.path = path
+        self._map = numpy.memmap(path, mode="r")
+        if bytes(self._map[:len(MAGIC)]) != MAGIC:
+            raise ValueError("{} is not a galaxy snapshot".format(path))
+        header_length = int.from_bytes(bytes(self._map[len(MAGIC):len(MAGIC) + 8]), "little")
+        header_end = len(MAGIC) + 8 + header_length
+        header = json.loads(bytes(self._map[len(MAGIC) + 8:header_end]).decode("utf-8"))
+        if header.get("layout") != LAYOUT:
+            raise ValueError("{} was written with a different snapshot layout".format(path))
+        start = header_end + _pad(header_end)
+        self.seed = header.get("seed", 0)
+
+        blocks = {name: self._map[start + offset:start + offset + length]
+                  for name, (offset, length) in header["blocks"].items()}
+        self.stars = blocks["stars"].view(STAR_DTYPE)
+        self.planets = blocks["planets"].view(PLANET_DTYPE)
+        self._strings = blocks["strings"]
+
+    def __len__(self):
+        return len(self.stars)
+
+    def string(self, offset, length):
+        if not length:
+            return None
+        return bytes(self._strings[offset:offset + length]).decode("utf-8")
+
+    def star_name(self, row):
+        star = self.stars[row]
+        return self.string(star["name_offset"], star["name_length"])
+
+    def star_population(self):
+        return numpy.bincount(self.planets["star"], weights=self.planets["population"], minlength=len(self.stars))
+
+    def table(self):
+        stars = self.stars
+        return StarTable(stars["hip"], stars["rect_ascension"], stars["declination"], stars["distance"],
+                         codes=stars["class_code"], position=(stars["x"], stars["y"], stars["z"]))
+
+    def starmap(self):
+        planets = self.planets
+        names = [self.string(offset, length) for offset, length
+                 in zip(planets["name_offset"].tolist(), planets["name_length"].tolist())]
+        store = PlanetStore.from_arrays(planets["orbital_distance"], planets["rocky"].astype(bool),
+                                        planets["population"], numpy.array(planets["founding_year"]), names,
+                                        self.seed)
+        starmap = []
+        for hip, ra, dec, dist, name_offset, name_length, class_offset, class_length, planet_start, planet_count, \
+                *_ in self.stars.tolist():
+            star = Star(hip, ra, dec, dist, name=self.string(name_offset, name_length),
+                        stellar_class=self.string(class_offset, class_length), store=store)
+            star._planet_start = planet_start
+            star._planet_count = planet_count
+            starmap.append(star)
+        self.table().bind(starmap)
+        return starmap
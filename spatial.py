@@ -0,0 +1,74 @@
+import math
+from collections import defaultdict
+
+from util import distance
+
+
+class SpatialIndex:
+    def __init__(self, items, cell_size=20, position=lambda item: item.position):
+        self.cell_size = cell_size
+        self._cells = defaultdict(list)
+        self._size = 0
+        self._lower = None
+        self._upper = None
+        for item in items:
+            self.insert(item, position(item))
+
+    def __len__(self):
+        return self._size
+
+    def _cell(self, position):
+        return tuple(int(math.floor(c / self.cell_size)) for c in position)
+
+    def insert(self, item, position):
+        self._cells[self._cell(position)].append((item, position))
+        self._size += 1
+        if self._lower is None:
+            self._lower, self._upper = list(position), list(position)
+        else:
+            self._lower = [min(a, b) for a, b in zip(self._lower, position)]
+            self._upper = [max(a, b) for a, b in zip(self._upper, position)]
+
+    def _candidate_cells(self, position, radius):
+        if math.isinf(radius):
+            return self._cells.values()
+        low = self._cell([c - radius for c in position])
+        high = self._cell([c + radius for c in position])
+        spans = [h - l + 1 for l, h in zip(low, high)]
+        if spans[0] * spans[1] * spans[2] > len(self._cells):
+            return self._cells.values()
+        cells = []
+        for x in range(low[0], high[0] + 1):
+            for y in range(low[1], high[1] + 1):
+                for z in range(low[2], high[2] + 1):
+                    cell = self._cells.get((x, y, z))
+                    if cell:
+                        cells.append(cell)
+        return cells
+
+    def within(self, position, radius):
+        found = []
+        for cell in self._candidate_cells(position, radius):
+            for item, item_position in cell:
+                d = distance(position, item_position)
+                if d <= radius:
+                    found.append((item, d))
+        found.sort(key=lambda p: p[1])
+        return found
+
+    def nearest(self, position, k):
+        if self._size == 0 or k <= 0:
+            return []
+        extent = distance(self._lower, self._upper) + distance(position, self._lower)
+        radius = self.cell_size
+        while True:
+            found = self.within(position, radius)
+            if len(found) >= k or radius > extent:
+                return found[:k]
+            radius *= 2
+
+
+def index_for(starmap):
+    # The index lives on the galaxy's StarTable, so it goes when the galaxy does
+    from star_table import StarTable
+    return StarTable.for_stars(starmap).index
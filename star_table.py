@@ -0,0 +1,82 @@
+import numpy
+
+from spatial import SpatialIndex
+from stellar_obj import CLASS_PROPERTIES, class_code, decode_class_code
+
+
+def cartesian(rect_ascension, declination, distance):
+    ra = rect_ascension / 12 * numpy.pi
+    dec = declination / 180 * numpy.pi
+    return numpy.sin(ra) * numpy.cos(dec) * distance, numpy.sin(ra) * numpy.sin(dec) * distance, \
+        numpy.cos(ra) * distance
+
+
+def class_codes(stellar_class):
+    # Only a few thousand distinct spectral strings exist, so parse each once and scatter
+    classes, inverse = numpy.unique(numpy.asarray(stellar_class, dtype=str), return_inverse=True)
+    return numpy.array([class_code(c) for c in classes], dtype=numpy.int8)[inverse.ravel()]
+
+
+class StarTable:
+    # Callers that already hold class codes and positions (snapshots) pass them in to skip parsing
+    def __init__(self, hip, rect_ascension, declination, distance, stellar_class=None, codes=None, position=None):
+        self.hip = numpy.asarray(hip, dtype=numpy.int64)
+        self.rect_ascension = numpy.asarray(rect_ascension, dtype=numpy.float64)
+        self.declination = numpy.asarray(declination, dtype=numpy.float64)
+        self.distance = numpy.asarray(distance, dtype=numpy.float64)
+        self.class_code = class_codes(stellar_class) if codes is None else numpy.asarray(codes, dtype=numpy.int8)
+        if position is None:
+            position = cartesian(self.rect_ascension, self.declination, self.distance)
+        self.x, self.y, self.z = (numpy.asarray(c, dtype=numpy.float64) for c in position)
+        # Built over the bound stars on first use and dropped along with the table; query.galaxy_for fills galaxy
+        self.stars = None
+        self.galaxy = None
+        self._index = None
+
+    @classmethod
+    def from_stars(cls, stars):
+        table = cls([s.hip for s in stars], [s.rect_ascension for s in stars], [s.declination for s in stars],
+                    [s.distance for s in stars], [s._stellar_class or "" for s in stars])
+        table.bind(stars)
+        return table
+
+    @classmethod
+    def for_stars(cls, stars):
+        table = stars[0]._table if stars else None
+        if table is not None and len(table) == len(stars) and (table.stars is stars or all(
+                star._table is table and star._row == row for row, star in enumerate(stars))):
+            return table
+        return cls.from_stars(stars)
+
+    def __getattr__(self, name):
+        # Derived columns are gathered from the class lookup table on demand rather than stored per star
+        if name in CLASS_PROPERTIES:
+            return CLASS_PROPERTIES[name][self.class_code]
+        raise AttributeError("{!r} object has no attribute {!r}".format(type(self).__name__, name))
+
+    def bind(self, stars):
+        for row, star in enumerate(stars):
+            star._table = self
+            star._row = row
+        self.stars = stars
+        self._index = None
+        self.galaxy = None
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = SpatialIndex(self.stars)
+        return self._index
+
+    def __len__(self):
+        return len(self.hip)
+
+    @property
+    def positions(self):
+        return numpy.column_stack((self.x, self.y, self.z))
+
+    def position(self, row):
+        return float(self.x[row]), float(self.y[row]), float(self.z[row])
+
+    def stellar_class(self, row):
+        return decode_class_code(int(self.class_code[row]))
@@ -1,39 +1,170 @@
+import datetime
 import json
-import requests
+import os
 import re
 import sys
+import threading
 import time
-import datetime
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+
+SIMBAD_URL = os.environ.get("SIMBAD_URL", "http://simbad.u-strasbg.fr/simbad/sim-id")
+JOURNAL_PATH = "spectypes.journal"
+SPECTYPES_PATH = "spectypes.json"
+
 
-with open("starcatalogue.json") as json_catalogue:
-    RAW_STARMAP = json.load(json_catalogue)["Stars"][79249:]
-
-NAMES = {}
-n = 0
-start = time.time()
-sleep = 0.05
-
-for s, star in enumerate(RAW_STARMAP):
-    hip = star["HIP"]
-    simbad = requests.get("http://simbad.u-strasbg.fr/simbad/sim-id?Ident=HIP%20{}&output.format=ASCII".format(hip)).text
-    n += 1
-    if n == 50:
-        now = time.time()
-        delta = now - start
-        each = delta / s
-        eta = (len(RAW_STARMAP) - s) * each
-        finish = datetime.datetime.now() + datetime.timedelta(seconds=eta)
-        print("{} of {}, {}% done, {}rps/{}s per request, {}s sleep per request, eta {}".format(s, len(RAW_STARMAP), round(s/len(RAW_STARMAP)*100, 2), round(1/each, 2), round(each, 2), round(sleep, 2), finish))
-        n = 0
+def parse_spectral_type(simbad):
     spec_type = re.findall(r"Spectral type: ([A-Za-z0-9\-]+)", simbad)
-    if spec_type:
-        names = spec_type[0]
-        NAMES[hip] = names
-        print(hip, names)
-    else:
-        print(hip, "FAILED")
-    time.sleep(sleep)
+    return spec_type[0] if spec_type else None
+
+
+def read_journal(path=JOURNAL_PATH):
+    # One JSON line per finished lookup, null for stars SIMBAD has no spectral type for; a torn last line
+    # from a crash is dropped and fetched again
+    fetched = {}
+    if os.path.exists(path):
+        with open(path) as journal:
+            for line in journal:
+                try:
+                    hip, spec_type = json.loads(line)
+                except ValueError:
+                    continue
+                fetched[hip] = spec_type
+    return fetched
+
+
+def merge_spectypes(fetched, path=SPECTYPES_PATH):
+    spectypes = {}
+    if os.path.exists(path):
+        with open(path) as json_spec:
+            spectypes = json.load(json_spec)
+    spectypes.update((str(hip), spec_type) for hip, spec_type in fetched.items() if spec_type)
+    with open(path + ".tmp", "w") as out:
+        json.dump(spectypes, out)
+    os.replace(path + ".tmp", path)
+    return spectypes
+
+
+class RateLimiter:
+    # Additive increase, multiplicative decrease: creep up while SIMBAD answers, halve when it pushes back.
+    # Requests already in flight when the first one fails don't halve it again
+    def __init__(self, rate=10, min_rate=0.5, max_rate=50, step=1, cooldown=1):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.step = step
+        self.cooldown = cooldown
+        self._next = time.monotonic()
+        self._backed_off = 0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + 1 / self.rate
+        if delay > 0:
+            time.sleep(delay)
+
+    def success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.step)
+
+    def backoff(self):
+        with self._lock:
+            now = time.monotonic()
+            if now - self._backed_off > self.cooldown:
+                self._backed_off = now
+                self.rate = max(self.min_rate, self.rate / 2)
+
+
+class Fetcher:
+    def __init__(self, base_url=SIMBAD_URL, journal_path=JOURNAL_PATH, spectypes_path=SPECTYPES_PATH,
+                 workers=8, limiter=None, retries=5, merge_every=500):
+        self.base_url = base_url
+        self.journal_path = journal_path
+        self.spectypes_path = spectypes_path
+        self.workers = workers
+        self.limiter = limiter or RateLimiter()
+        self.retries = retries
+        self.merge_every = merge_every
+        self._local = threading.local()
+
+    def _session(self):
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def fetch(self, hip):
+        for attempt in range(self.retries):
+            self.limiter.wait()
+            try:
+                response = self._session().get(self.base_url, params={"Ident": "HIP {}".format(hip),
+                                                                      "output.format": "ASCII"}, timeout=30)
+            except requests.RequestException:
+                self.limiter.backoff()
+                continue
+            # Only a proper answer can say a star has no spectral type; anything else is tried again
+            if not response.ok:
+                self.limiter.backoff()
+                continue
+            self.limiter.success()
+            return parse_spectral_type(response.text)
+        raise RuntimeError("HIP {} failed after {} attempts".format(hip, self.retries))
+
+    def run(self, hips):
+        fetched = read_journal(self.journal_path)
+        pending = iter([hip for hip in hips if hip not in fetched])
+        total = len(hips) - len(fetched)
+        done = failed = 0
+        start = time.time()
+
+        # At most two requests queued per worker, so a huge catalogue never sits in memory as futures
+        with ThreadPoolExecutor(self.workers) as pool, open(self.journal_path, "a") as journal:
+            in_flight = {}
+            while True:
+                while len(in_flight) < self.workers * 2:
+                    hip = next(pending, None)
+                    if hip is None:
+                        break
+                    in_flight[pool.submit(self.fetch, hip)] = hip
+                if not in_flight:
+                    break
+
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    hip = in_flight.pop(future)
+                    try:
+                        spec_type = future.result()
+                    except RuntimeError as error:
+                        failed += 1
+                        print(error)
+                        continue
+                    journal.write(json.dumps([hip, spec_type]) + "\n")
+                    journal.flush()
+                    fetched[hip] = spec_type
+                    done += 1
+                    print(hip, spec_type or "FAILED")
+
+                    if done % 50 == 0:
+                        each = (time.time() - start) / done
+                        finish = datetime.datetime.now() + datetime.timedelta(seconds=(total - done) * each)
+                        print("{} of {}, {}% done, {}rps, limit {}rps, eta {}".format(
+                            done, total, round(done / total * 100, 2), round(1 / each, 2),
+                            round(self.limiter.rate, 2), finish))
+                    if done % self.merge_every == 0:
+                        merge_spectypes(fetched, self.spectypes_path)
+
+        merge_spectypes(fetched, self.spectypes_path)
+        return done, failed
+
 
-with open("spectypes.json", "w") as out:
-    json.dump(NAMES, out)
+if __name__ == '__main__':
+    with open("starcatalogue.json") as json_catalogue:
+        HIPS = [star["HIP"] for star in json.load(json_catalogue)["Stars"]]
 
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    base_url = sys.argv[2] if len(sys.argv) > 2 else SIMBAD_URL
+    done, failed = Fetcher(base_url, workers=workers).run(HIPS)
+    print("Fetched {}, {} still to retry".format(done, failed))
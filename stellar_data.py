@@ -1,10 +1,15 @@
 import csv
 import json
+import os
 import random
-from collections import defaultdict
+import zipfile
 
-from stellar_obj import Star, Planet
-from util import unique
+import numpy
+
+from names import NameGenerator
+from planet_store import PlanetStore
+from star_table import StarTable
+from stellar_obj import Star
 
 SPECIAL_NAMES = {71681: "Alpha Centauri A", 71683: "Alpha Centauri B",
                  54035: "Lalande 21185", 16537: "Epsilon Eridani", 114046: "Lacaille 9352",
@@ -103,45 +108,106 @@ SPECIAL_NAMES = {71681: "Alpha Centauri A", 71683: "Alpha Centauri B",
                  115623: 'Alkarab', 116076: 'Veritate', 116727: 'Errai', }
 
 
-with open("starcatalogue.json") as json_catalogue:
-    RAW_STARMAP = json.load(json_catalogue)["Stars"]
+CATALOGUE_PATH = "starcatalogue.json"
+SPECTYPES_PATH = "spectypes.json"
+STARNAMES_PATH = "starnames.csv"
+CACHE_PATH = os.path.join(".cache", "catalogue.npz")
 
-with open("starnames.csv") as csv_names:
-    STARNAMES = [name.lower() for name, mag, ra, dec in csv.reader(csv_names)]
-    STARNAME_MARKOV = defaultdict(lambda: [])
-    for name in STARNAMES:
-        for n, char in enumerate(name):
-            STARNAME_MARKOV[name[max(0, n - 3):n]].append(char)
-        STARNAME_MARKOV[name[-3:]].append(None)
+USED_STARNAMES = set()
 
-with open("spectypes.json") as json_spec:
-    STAR_CLASS = json.load(json_spec)
+_LOADED = {}
 
-USED_STARNAMES = set()
+
+def _fingerprint(*paths):
+    return json.dumps([(path, os.stat(path).st_mtime_ns, os.stat(path).st_size) for path in paths])
+
+
+def load_raw_catalogue(catalogue_path=CATALOGUE_PATH):
+    with open(catalogue_path) as json_catalogue:
+        return json.load(json_catalogue)["Stars"]
+
+
+def load_star_classes(spectypes_path=SPECTYPES_PATH):
+    with open(spectypes_path) as json_spec:
+        return json.load(json_spec)
+
+
+def load_catalogue(catalogue_path=CATALOGUE_PATH, spectypes_path=SPECTYPES_PATH, cache_path=CACHE_PATH):
+    fingerprint = _fingerprint(catalogue_path, spectypes_path)
+    if cache_path and os.path.exists(cache_path):
+        # A torn or corrupt cache is just a miss, it gets rebuilt below
+        try:
+            with numpy.load(cache_path) as cached:
+                if str(cached["fingerprint"]) == fingerprint:
+                    return {key: cached[key] for key in cached.files if key != "fingerprint"}
+        except (OSError, ValueError, zipfile.BadZipFile, KeyError):
+            pass
+
+    star_classes = load_star_classes(spectypes_path)
+    stars = [star for star in load_raw_catalogue(catalogue_path) if str(star["HIP"]) in star_classes]
+    catalogue = {
+        "hip": numpy.array([star["HIP"] for star in stars], dtype=numpy.int64),
+        "rectascension": numpy.array([star["rectascension"] for star in stars], dtype=numpy.float64),
+        "declination": numpy.array([star["declination"] for star in stars], dtype=numpy.float64),
+        "distance": numpy.array([star["distance"] for star in stars], dtype=numpy.float64),
+        "stellar_class": numpy.array([star_classes[str(star["HIP"])] for star in stars], dtype=str),
+    }
+    if cache_path:
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        with open(cache_path + ".tmp", "wb") as cache_file:
+            numpy.savez(cache_file, fingerprint=fingerprint, **catalogue)
+        os.replace(cache_path + ".tmp", cache_path)
+    return catalogue
+
+
+def load_names(starnames_path=STARNAMES_PATH):
+    with open(starnames_path) as csv_names:
+        return [name.lower() for name, mag, ra, dec in csv.reader(csv_names)]
+
+
+def load_starmap(catalogue=None, seed=0):
+    if catalogue is None:
+        catalogue = load_catalogue()
+
+    store = PlanetStore(seed=seed)
+    sol = Star(0, 0, 0, 0, name="Sol", stellar_class="G8", store=store)
+    sol.set_planets([{"orbital_distance": orbit, "population": population, "name": name, "founding_year": founded}
+                     for orbit, population, name, founded in [(0.72, 1e9, "Venus", 0), (1, 5e9, "Earth", 0),
+                                                              (1.6, 3e9, "Mars", 100), (2.5, 2e9, "Belt", 100),
+                                                              (5.2, 4e9, "Jupiter", 125), (9.5, 2e9, "Saturn", 130)]])
+    starmap = [sol]
+
+    for hip, ra, dec, dist, stellar_class in zip(catalogue["hip"].tolist(), catalogue["rectascension"].tolist(),
+                                                 catalogue["declination"].tolist(), catalogue["distance"].tolist(),
+                                                 catalogue["stellar_class"].tolist()):
+        starmap.append(Star(hip, ra, dec, dist, name=SPECIAL_NAMES.get(hip), stellar_class=stellar_class, store=store))
+
+    StarTable.from_stars(starmap)
+    return starmap
+
+
+_LOADERS = {
+    "RAW_STARMAP": lambda: load_raw_catalogue(),
+    "STAR_CLASS": lambda: load_star_classes(),
+    "STARNAMES": lambda: load_names(),
+    "NAME_GENERATOR": lambda: NameGenerator(_load("STARNAMES"), USED_STARNAMES),
+    "STARMAP": lambda: load_starmap(seed=int(os.environ.get("STARMAP_GALAXY_SEED", 0))),
+    "SOL": lambda: _load("STARMAP")[0],
+    "STAR_TABLE": lambda: _load("STARMAP")[0]._table,
+}
+
+
+def _load(name):
+    if name not in _LOADED:
+        _LOADED[name] = _LOADERS[name]()
+    return _LOADED[name]
+
+
+def __getattr__(name):
+    if name in _LOADERS:
+        return _load(name)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
 
 
-@unique(USED_STARNAMES, limit=1000)
-def get_star_name():
-    name = ""
-    while True:
-        char = random.choice(STARNAME_MARKOV[name[max(0, len(name) - 3):]])
-        if char is None:
-            if len(name) < 3:
-                continue
-            return name.title()
-        name += char
-
-
-SOL = Star(0, 0, 0, 0, name="Sol", stellar_class="G8")
-SOL._planets = [Planet(SOL, 0.72, 1e9, "Venus", 0), Planet(SOL, 1, 5e9, "Earth", 0), Planet(SOL, 1.6, 3e9, "Mars", 100),
-                Planet(SOL, 2.5, 2e9, "Belt", 100),
-                Planet(SOL, 5.2, 4e9, "Jupiter", 125), Planet(SOL, 9.5, 2e9, "Saturn", 130)]
-STARMAP = [SOL]
-
-for star in RAW_STARMAP:
-    # if abs(star["distance"]) > 750 or str(star["HIP"]) not in STAR_CLASS:
-    if str(star["HIP"]) not in STAR_CLASS:
-        continue
-    s = Star(name=SPECIAL_NAMES.get(star['HIP']), stellar_class=STAR_CLASS[str(star["HIP"])], **star)
-    x, y, z = s.position
-    STARMAP.append(s)
+def get_star_name(rng=random):
+    return _load("NAME_GENERATOR").name(rng)
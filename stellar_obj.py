@@ -1,20 +1,133 @@
 import math
 import random
-
-from util import distance
+from functools import lru_cache
+
+import numpy
+
+from planet_store import PlanetStore
+from spatial import index_for
+
+CLASS_LETTERS = "OBAFGKM"
+
+TEMPERATURES = {
+    "O": (30000, 10000),
+    "B": (10000, 30000),
+    "A": (7500, 10000),
+    "F": (6000, 7500),
+    "G": (5200, 6000),
+    "K": (3700, 5200),
+    "M": (2400, 3700),
+}
+
+MASSES = {
+    "O": (16, 120),
+    "B": (2.1, 16),
+    "A": (1.4, 2.1),
+    "F": (1.04, 1.4),
+    "G": (0.8, 1.04),
+    "K": (0.45, 0.8),
+    "M": (0.08, 0.45),
+}
+
+RADII = {
+    "O": (6.6, 50),
+    "B": (1.8, 6.6),
+    "A": (1.4, 1.8),
+    "F": (1.15, 1.4),
+    "G": (0.96, 1.15),
+    "K": (0.7, 0.96),
+    "M": (0.1, 0.7),
+}
+
+LUMINOSITIES = {
+    "O": (30000, 100000),
+    "B": (25, 30000),
+    "A": (5, 25),
+    "F": (1.5, 5),
+    "G": (0.6, 1.5),
+    "K": (0.08, 0.6),
+    "M": (0, 0.08),
+}
+
+
+def parse_stellar_class(stellar_class):
+    if len(stellar_class) < 2:
+        return "G", 2
+    letter, number = stellar_class[:2]
+    letter = letter.upper()
+    if letter not in CLASS_LETTERS:
+        return "G", 2
+    if number not in "0123456789":
+        number = 5
+    else:
+        number = int(number)
+
+    return letter, number
+
+
+@lru_cache(maxsize=None)
+def class_code(stellar_class):
+    letter, number = parse_stellar_class(stellar_class or "")
+    return CLASS_LETTERS.index(letter) * 10 + number
+
+
+def decode_class_code(code):
+    return CLASS_LETTERS[code // 10], code % 10
+
+
+def _class_column(ranges):
+    low = numpy.repeat([ranges[letter][0] for letter in CLASS_LETTERS], 10).astype(numpy.float64)
+    high = numpy.repeat([ranges[letter][1] for letter in CLASS_LETTERS], 10).astype(numpy.float64)
+    return low + (high - low) * (numpy.tile(numpy.arange(10), len(CLASS_LETTERS)) / 9)
+
+
+# Everything derived from a spectral class, indexed by class code (letter * 10 + number)
+CLASS_PROPERTIES = {
+    "temperature": _class_column(TEMPERATURES),
+    "mass": _class_column(MASSES),
+    "radius": _class_column(RADII),
+    "luminosity": _class_column(LUMINOSITIES),
+}
+CLASS_PROPERTIES["hz_inner"] = numpy.sqrt(CLASS_PROPERTIES["luminosity"] / 1.1)
+CLASS_PROPERTIES["hz_outer"] = numpy.sqrt(CLASS_PROPERTIES["luminosity"] / 0.53)
+CLASS_PROPERTIES["frost_line"] = CLASS_PROPERTIES["hz_outer"] * 2.25
+# Plain lists for per-star lookups, which are much cheaper than indexing numpy scalars
+_CLASS_VALUES = {name: column.tolist() for name, column in CLASS_PROPERTIES.items()}
+
+
+PLANETS = PlanetStore()
+
+
+def system_rng(seed, hip):
+    # String seeds are hashed with SHA-512, so every process gets the same stream for a given system
+    return random.Random("{}:{}".format(seed, hip))
+
+
+def generate_planets(stars):
+    for star in stars:
+        if not star.has_planets:
+            star._generate_planets()
 
 
 class Star:
-    def __init__(self, HIP, rectascension, declination, distance, name=None, planets=None, stellar_class=None, **excess):
+    def __init__(self, HIP, rectascension, declination, distance, name=None, planets=None, stellar_class=None,
+                 store=None, **excess):
         self.hip = HIP
         self.name = name if name else "HIP " + str(HIP)
         self.rect_ascension = rectascension
         self.declination = declination
         self.distance = distance
         self._stellar_class = stellar_class
+        self._class_code = class_code(stellar_class)
 
-        self._planets = [] if planets is None else [Planet(self, **planet) for planet in planets]
+        self._table = None
+        self._row = None
+        self._store = PLANETS if store is None else store
+        self._planet_start = 0
+        self._planet_count = 0
         self._closest_stars = None
+        if planets:
+            self.set_planets(planets)
 
     def to_json(self):
         return {
@@ -29,100 +142,37 @@ class Star:
 
     @property
     def stellar_class(self):
-        if len(self._stellar_class) < 2:
-            return "G", 2
-        letter, number = self._stellar_class[:2]
-        letter = letter.upper()
-        if letter not in "OBAFGKM":
-            return "G", 2
-        if number not in "0123456789":
-            number = 5
-        else:
-            number = int(number)
-
-        return letter, number
+        return decode_class_code(self._class_code)
 
     @property
     def temperature(self):
-        temps = {
-            "O": (30000, 10000),
-            "B": (10000, 30000),
-            "A": (7500, 10000),
-            "F": (6000, 7500),
-            "G": (5200, 6000),
-            "K": (3700, 5200),
-            "M": (2400, 3700),
-        }
-
-        letter, number = self.stellar_class
-        min_t, max_t = temps[letter]
-        mod = number / 9
-        return min_t + (max_t - min_t) * mod
+        return _CLASS_VALUES["temperature"][self._class_code]
 
     @property
     def mass(self):
-        masses = {
-            "O": (16, 120),
-            "B": (2.1, 16),
-            "A": (1.4, 2.1),
-            "F": (1.04, 1.4),
-            "G": (0.8, 1.04),
-            "K": (0.45, 0.8),
-            "M": (0.08, 0.45),
-        }
-
-        letter, number = self.stellar_class
-        min_t, max_t = masses[letter]
-        mod = number / 9
-        return min_t + (max_t - min_t) * mod
+        return _CLASS_VALUES["mass"][self._class_code]
 
     @property
     def radius(self):
-        radius = {
-            "O": (6.6, 50),
-            "B": (1.8, 6.6),
-            "A": (1.4, 1.8),
-            "F": (1.15, 1.4),
-            "G": (0.96, 1.15),
-            "K": (0.7, 0.96),
-            "M": (0.1, 0.7),
-        }
-
-        letter, number = self.stellar_class
-        min_t, max_t = radius[letter]
-        mod = number / 9
-        return min_t + (max_t - min_t) * mod
+        return _CLASS_VALUES["radius"][self._class_code]
 
     @property
     def luminosity(self):
-        luminosity = {
-            "O": (30000, 100000),
-            "B": (25, 30000),
-            "A": (5, 25),
-            "F": (1.5, 5),
-            "G": (0.6, 1.5),
-            "K": (0.08, 0.6),
-            "M": (0, 0.08),
-        }
-
-        letter, number = self.stellar_class
-        min_t, max_t = luminosity[letter]
-        mod = number / 9
-        return min_t + (max_t - min_t) * mod
+        return _CLASS_VALUES["luminosity"][self._class_code]
 
     @property
     def habitable_zone(self):
-        return math.sqrt(self.luminosity / 1.1), math.sqrt(self.luminosity / 0.53)
+        return _CLASS_VALUES["hz_inner"][self._class_code], _CLASS_VALUES["hz_outer"][self._class_code]
 
     @property
     def frost_line(self):
-        min_hab, max_hab = self.habitable_zone
-        return max_hab * 2.25
+        return _CLASS_VALUES["frost_line"][self._class_code]
 
     def _generate_planets(self):
-        planets = []
+        rng = system_rng(self._store.seed, self.hip)
+        orbits = []
 
-        num_planets = random.randint(5, 12)
+        num_planets = rng.randint(5, 12)
         inners = num_planets // 2
         outers = num_planets - inners
 
@@ -132,28 +182,68 @@ class Star:
 
         for n in range(num_planets):
             if n < inners:
-                orbital_radius = (inner_swathe * random.random() + (inner_swathe * n) + 50) / 215
+                orbital_radius = (inner_swathe * rng.random() + (inner_swathe * n) + 50) / 215
             else:
-                orbital_radius = (outer_swathe * random.random() + (outer_swathe * n) + frost_line + 50) / 215
-            planets.append(Planet(self, orbital_radius))
+                orbital_radius = (outer_swathe * rng.random() + (outer_swathe * n) + frost_line + 50) / 215
+            orbits.append(orbital_radius)
+
+        self.set_planets([{"orbital_distance": orbit} for orbit in orbits])
+
+    def set_planets(self, planets):
+        frost_line = self.frost_line
+        orbits = [planet["orbital_distance"] for planet in planets]
+        self._planet_start = self._store.extend(
+            orbits,
+            [planet["rocky"] if planet.get("rocky") is not None else orbit < frost_line
+             for planet, orbit in zip(planets, orbits)],
+            [planet.get("population", 0) for planet in planets],
+            [planet.get("founding_year") for planet in planets],
+            [planet.get("name") for planet in planets])
+        self._planet_count = len(planets)
 
-        return planets
+    @property
+    def has_planets(self):
+        return self._planet_count > 0
+
+    @property
+    def existing_planets(self):
+        return [Planet(self, self._planet_start + n) for n in range(self._planet_count)]
 
     @property
     def planets(self):
-        if not self._planets:
-            self._planets = self._generate_planets()
+        if not self._planet_count:
+            self._generate_planets()
 
-        return self._planets
+        return self.existing_planets
 
-    def closest_stars(self, starmap):
-        if self._closest_stars is None:
-            self._closest_stars = list(
-                sorted([(s, distance(self.position, s.position)) for s in starmap], key=lambda p: p[1]))[1:]
-        return self._closest_stars
+    @property
+    def population(self):
+        start = self._planet_start
+        return float(self._store.population[start:start + self._planet_count].sum())
+
+    @property
+    def has_population(self):
+        return self._store.populated(self._planet_start, self._planet_count)
+
+    def closest_stars(self, starmap, radius=float("inf"), count=None):
+        index = index_for(starmap)
+        if count is None and not math.isinf(radius):
+            # Only the stars within a bounded radius are kept, so the cache stays O(N*k) across the galaxy
+            cached = self._closest_stars
+            if cached is None or cached[0] is not index or cached[1] != radius:
+                cached = (index, radius, [(s, d) for s, d in index.within(self.position, radius) if s is not self])
+                self._closest_stars = cached
+            return cached[2]
+        if count is None:
+            neighbours = index.within(self.position, radius)
+        else:
+            neighbours = [(s, d) for s, d in index.nearest(self.position, count + 1) if d <= radius]
+        return [(s, d) for s, d in neighbours if s is not self][:count]
 
     @property
     def position(self):
+        if self._table is not None:
+            return self._table.position(self._row)
         x = math.sin(self.rect_ascension / 12 * math.pi) * math.cos(
             self.declination / 180 * math.pi) * self.distance
         y = math.sin(self.rect_ascension / 12 * math.pi) * math.sin(
@@ -170,13 +260,54 @@ class Star:
 
 
 class Planet:
-    def __init__(self, star, orbital_distance, population=0, name=None, founding_year=None):
-        self.orbital_distance = orbital_distance
-        self.founding_year = founding_year
-        self.rocky = self.orbital_distance < star.frost_line
-        self._name = name
-        self.population = population
+    __slots__ = ("star", "_index")
+
+    def __init__(self, star, index):
         self.star = star
+        self._index = index
+
+    def __eq__(self, other):
+        return isinstance(other, Planet) and self._index == other._index and self.star._store is other.star._store
+
+    def __hash__(self):
+        return self._index
+
+    def __repr__(self):
+        return "<Planet ({})>".format(self.name)
+
+    @property
+    def index(self):
+        return self._index - self.star._planet_start
+
+    @property
+    def orbital_distance(self):
+        return float(self.star._store.orbital_distance[self._index])
+
+    @property
+    def rocky(self):
+        return bool(self.star._store.rocky[self._index])
+
+    @property
+    def population(self):
+        return int(self.star._store.population[self._index])
+
+    @population.setter
+    def population(self, population):
+        self.star._store.population[self._index] = population
+
+    @property
+    def founding_year(self):
+        founding_year = self.star._store.founding_year[self._index]
+        return None if numpy.isnan(founding_year) else int(founding_year)
+
+    @founding_year.setter
+    def founding_year(self, founding_year):
+        self.star._store.founding_year[self._index] = numpy.nan if founding_year is None else founding_year
+
+    @property
+    def _name(self):
+        name = self.star._store.name[self._index]
+        return None if name < 0 else self.star._store.names[name]
 
     def to_json(self):
         return {
@@ -206,7 +337,7 @@ class Planet:
     def name(self):
         if self._name:
             return self._name
-        return self.star.name + " " + "abcdefghijklmn"[self.star.planets.index(self)]
+        return self.star.name + " " + "abcdefghijklmn"[self.index]
 
     def growth_rate(self, current_year):
         if self.founding_year is None:
@@ -0,0 +1,106 @@
+import json
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from starname_fetcher import Fetcher, RateLimiter, read_journal
+
+
+class StubSimbad:
+    # Answers like SIMBAD's ASCII output; failures[hip] is how many requests for it get an error first
+    def __init__(self, spectypes, failures=None, status=500):
+        self.spectypes = spectypes
+        self.failures = dict(failures or {})
+        self.status = status
+        self.requests = Counter()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                hip = int(parse_qs(urlparse(self.path).query)["Ident"][0].split()[1])
+                stub.requests[hip] += 1
+                if stub.failures.get(hip, 0) > 0:
+                    stub.failures[hip] -= 1
+                    self.send_response(stub.status)
+                    self.end_headers()
+                    return
+                spec_type = stub.spectypes.get(hip)
+                body = "Object HIP {}\n".format(hip)
+                if spec_type:
+                    body += "Spectral type: {} C ~\n".format(spec_type)
+                self.send_response(200)
+                self.end_headers()
+                self.wfile.write(body.encode())
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = "http://127.0.0.1:{}/simbad/sim-id".format(self.server.server_port)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def simbad():
+    servers = []
+
+    def start(*args, **kwargs):
+        servers.append(StubSimbad(*args, **kwargs))
+        return servers[-1]
+    yield start
+    for server in servers:
+        server.close()
+
+
+def fetcher(url, directory, retries=5):
+    return Fetcher(url, journal_path=str(directory / "spectypes.journal"),
+                   spectypes_path=str(directory / "spectypes.json"), workers=4, retries=retries,
+                   limiter=RateLimiter(rate=1000, min_rate=100, max_rate=1000, cooldown=0))
+
+
+def spectypes(directory):
+    with open(directory / "spectypes.json") as json_spec:
+        return json.load(json_spec)
+
+
+def test_fetches_and_merges(simbad, tmp_path):
+    server = simbad({1: "G2V", 2: "K1III", 3: None})
+    assert fetcher(server.url, tmp_path).run([1, 2, 3]) == (3, 0)
+    assert spectypes(tmp_path) == {"1": "G2V", "2": "K1III"}
+    assert read_journal(str(tmp_path / "spectypes.journal")) == {1: "G2V", 2: "K1III", 3: None}
+
+
+def test_resume_skips_journaled_stars(simbad, tmp_path):
+    server = simbad({1: "G2V", 2: "K1III", 3: "M4V"})
+    with open(tmp_path / "spectypes.journal", "w") as journal:
+        journal.write(json.dumps([1, "G2V"]) + "\n" + json.dumps([3, None]) + "\n" + '[2, "K')
+    assert fetcher(server.url, tmp_path).run([1, 2, 3]) == (1, 0)
+    assert server.requests == {2: 1}
+    assert spectypes(tmp_path) == {"1": "G2V", "2": "K1III"}
+
+
+@pytest.mark.parametrize("status", [500, 403, 404, 429, 503])
+def test_errors_are_retried(simbad, tmp_path, status):
+    server = simbad({1: "G2V", 2: "A0"}, failures={1: 2}, status=status)
+    assert fetcher(server.url, tmp_path).run([1, 2]) == (2, 0)
+    assert server.requests[1] == 3
+    assert spectypes(tmp_path) == {"1": "G2V", "2": "A0"}
+
+
+def test_failed_stars_are_not_journaled(simbad, tmp_path):
+    server = simbad({1: "G2V", 2: "A0"}, failures={1: 10})
+    assert fetcher(server.url, tmp_path, retries=3).run([1, 2]) == (1, 1)
+    assert read_journal(str(tmp_path / "spectypes.journal")) == {2: "A0"}
+
+    # Once SIMBAD recovers, a restart picks the failed star up again
+    server.failures.clear()
+    assert fetcher(server.url, tmp_path).run([1, 2]) == (1, 0)
+    assert read_journal(str(tmp_path / "spectypes.journal")) == {1: "G2V", 2: "A0"}
+    assert spectypes(tmp_path) == {"1": "G2V", "2": "A0"}
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+
+import numpy
+
+from raster import Projection, render_tile
+
+TILE_SIZE = 256
+MANIFEST = "tiles.json"
+
+
+def read_manifest(path):
+    manifest_path = os.path.join(path, MANIFEST)
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path) as manifest_file:
+        manifest = json.load(manifest_file)
+    # Manifests from before the radius was kept are just the tile hashes
+    return manifest if "tiles" in manifest else {"tiles": manifest}
+
+
+class TilePyramid:
+    def __init__(self, x, y, z, colours, radius, max_zoom, background, plane_colour=None):
+        self.x, self.y, self.z = x, y, z
+        self.colours = colours
+        self.radius = radius
+        self.max_zoom = max_zoom
+        self.background = background
+        self.plane_colour = plane_colour
+        # Screen coordinates scale linearly with map size, so project once at unit size
+        unit = Projection(radius, 1)
+        self._unit_x, self._unit_y, self.star_size = unit(x, y, z)
+        self._unit_plane = unit.plane
+
+    def projection(self, zoom):
+        return Projection(self.radius, TILE_SIZE * 2 ** zoom)
+
+    def _bins(self, zoom):
+        tiles = 2 ** zoom
+        tx = numpy.clip(numpy.floor(self._unit_x * tiles), -1, tiles).astype(numpy.int64)
+        ty = numpy.clip(numpy.floor(self._unit_y * tiles), -1, tiles).astype(numpy.int64)
+        keys = (tx + 1) * (tiles + 2) + (ty + 1)
+        order = numpy.argsort(keys, kind="stable")
+        return keys[order], order, tiles
+
+    def _plane_tiles(self, zoom):
+        if self.plane_colour is None:
+            return set()
+        tiles = 2 ** zoom
+        (left, top), (right, bottom) = self._unit_plane
+        angles = numpy.linspace(0, 2 * numpy.pi, 64 * tiles, endpoint=False)
+        px = numpy.floor(((left + right) / 2 + (right - left) / 2 * numpy.cos(angles)) * tiles)
+        py = numpy.floor(((top + bottom) / 2 + (bottom - top) / 2 * numpy.sin(angles)) * tiles)
+        return set(zip(px.astype(int).tolist(), py.astype(int).tolist()))
+
+    def tiles(self, zoom):
+        keys, order, tiles = self._bins(zoom)
+        occupied = numpy.unique(keys)
+        wanted = {(int(k // (tiles + 2)) - 1, int(k % (tiles + 2)) - 1) for k in occupied}
+        # A star's disc can spill a few pixels over the edge of its own tile, so neighbours count too
+        wanted = {(tx + dx, ty + dy) for tx, ty in wanted for dx in (-1, 0, 1) for dy in (-1, 0, 1)}
+        wanted |= self._plane_tiles(zoom)
+
+        for tx, ty in sorted(wanted):
+            if not (0 <= tx < tiles and 0 <= ty < tiles):
+                continue
+            indices = []
+            for dx in (-1, 0, 1):
+                key = (tx + dx + 1) * (tiles + 2) + ty
+                start, end = numpy.searchsorted(keys, [key, key + 3])
+                indices.append(order[start:end])
+            yield tx, ty, numpy.sort(numpy.concatenate(indices))
+
+    def tile_hash(self, zoom, tx, ty, indices):
+        scale = TILE_SIZE * 2 ** zoom
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(json.dumps([self.radius, zoom, tx, ty, self.plane_colour is not None,
+                                  numpy.asarray(self.background).tolist()]).encode())
+        digest.update(numpy.round(self._unit_x[indices] * scale, 2).tobytes())
+        digest.update(numpy.round(self._unit_y[indices] * scale, 2).tobytes())
+        digest.update(numpy.round(self.star_size[indices], 2).tobytes())
+        digest.update(self.colours[indices].tobytes())
+        return digest.hexdigest()
+
+    def render(self, zoom, tx, ty, indices):
+        return render_tile(self.projection(zoom), self.x[indices], self.y[indices], self.z[indices],
+                           self.colours[indices], self.background, (tx * TILE_SIZE, ty * TILE_SIZE),
+                           (TILE_SIZE, TILE_SIZE), self.plane_colour)
+
+    def write(self, path):
+        manifest = read_manifest(path).get("tiles", {})
+
+        rendered = skipped = 0
+        updated = {}
+        for zoom in range(self.max_zoom + 1):
+            for tx, ty, indices in self.tiles(zoom):
+                tile = "{}/{}/{}".format(zoom, tx, ty)
+                tile_path = os.path.join(path, str(zoom), str(tx), "{}.png".format(ty))
+                updated[tile] = self.tile_hash(zoom, tx, ty, indices)
+                if manifest.get(tile) == updated[tile] and os.path.exists(tile_path):
+                    skipped += 1
+                    continue
+                os.makedirs(os.path.dirname(tile_path), exist_ok=True)
+                self.render(zoom, tx, ty, indices).save(tile_path, "PNG")
+                rendered += 1
+
+        for tile in set(manifest) - set(updated):
+            stale = os.path.join(path, *tile.split("/")) + ".png"
+            if os.path.exists(stale):
+                os.remove(stale)
+
+        with open(os.path.join(path, MANIFEST), "w") as manifest_file:
+            json.dump({"radius": self.radius, "tiles": updated}, manifest_file)
+        return rendered, skipped
@@ -45,5 +45,5 @@ def distance(p1, p2):
 
 
 def filter_to_inhabited(starmap):
-    distance = max(abs(star.distance) for star in starmap if any(planet.population > 0 for planet in star.planets))
+    distance = max(abs(star.distance) for star in starmap if star.has_population)
     return [star for star in starmap if abs(star.distance) < distance * 1.1]